@@ -0,0 +1,208 @@
+"""
+Admission Control Module
+Per-endpoint concurrency limits with a bounded wait queue, fast rejection
+and coalescing of identical in-flight operations
+"""
+import math
+import time
+import threading
+from functools import wraps
+from flask import current_app, jsonify, make_response
+from config import Config
+
+_gates = {}
+_gates_lock = threading.Lock()
+
+
+class Rejected(Exception):
+    """Raised when an operation cannot be admitted"""
+
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Gate:
+    """
+    Lets max_concurrent operations run and up to max_waiting wait for a slot
+
+    Callers beyond the queue are rejected at once (429); callers that wait
+    longer than wait_timeout give up (503). Durations of finished
+    operations feed the Retry-After estimate.
+    """
+
+    def __init__(self, name, max_concurrent, max_waiting, wait_timeout):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self._slots = threading.Semaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._running = 0
+        self._avg_duration = None
+        self._inflight = {}  # coalescing key -> [Event, result, error]
+
+    def retry_after(self):
+        """Seconds until a slot is likely to free up"""
+        with self._lock:
+            avg = self._avg_duration or 1.0
+            queued = self._waiting + self._running
+        return max(1, math.ceil(avg * queued / self.max_concurrent))
+
+    def acquire(self):
+        with self._lock:
+            if self._waiting >= self.max_waiting and self._running >= self.max_concurrent:
+                raise Rejected(f'{self.name} is busy', 429, None)
+            self._waiting += 1
+        try:
+            acquired = self._slots.acquire(timeout=self.wait_timeout)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        if not acquired:
+            raise Rejected(f'Timed out waiting for {self.name}', 503, None)
+        with self._lock:
+            self._running += 1
+
+    def release(self, duration):
+        with self._lock:
+            self._running -= 1
+            if self._avg_duration is None:
+                self._avg_duration = duration
+            else:
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+        self._slots.release()
+
+    def run(self, fn, coalesce_key=None):
+        """
+        Run fn() once admitted
+
+        With a coalesce_key, callers arriving while an identical operation
+        is in flight wait for it and share its result instead of queueing.
+
+        Raises:
+            Rejected: if the queue is full or the wait timed out
+        """
+        if coalesce_key is not None:
+            with self._lock:
+                shared = self._inflight.get(coalesce_key)
+                leader = shared is None
+                if leader:
+                    shared = self._inflight[coalesce_key] = [threading.Event(), None, None]
+            if not leader:
+                shared[0].wait()
+                if shared[2] is not None:
+                    raise shared[2]
+                return shared[1]
+
+        try:
+            self.acquire()
+            started = time.monotonic()
+            try:
+                result = fn()
+            finally:
+                self.release(time.monotonic() - started)
+            if coalesce_key is not None:
+                shared[1] = result
+            return result
+        except Exception as e:
+            if coalesce_key is not None:
+                shared[2] = e
+            raise
+        finally:
+            if coalesce_key is not None:
+                with self._lock:
+                    self._inflight.pop(coalesce_key, None)
+                shared[0].set()
+
+
+def get_gate(name):
+    """The gate for an endpoint, sized from Config.ADMISSION_LIMITS"""
+    with _gates_lock:
+        gate = _gates.get(name)
+        if gate is None:
+            limits = Config.ADMISSION_LIMITS.get(name, {})
+            gate = _gates[name] = Gate(
+                name,
+                max_concurrent=limits.get('concurrency', 1),
+                max_waiting=limits.get('queue', 0),
+                wait_timeout=limits.get('timeout', Config.ADMISSION_WAIT_TIMEOUT)
+            )
+        return gate
+
+
+def _reject_response(error, gate, as_json):
+    retry_after = error.retry_after or gate.retry_after()
+    message = f'{error}. Please retry in {retry_after} seconds.'
+    if as_json:
+        response = jsonify({'success': False, 'error': message})
+    else:
+        response = make_response(message)
+        response.mimetype = 'text/plain'
+    response.status_code = error.status
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def admission_control(name, coalesce=False, as_json=True):
+    """
+    Decorator limiting how many requests a view handles at once
+
+    Args:
+        name: Key into Config.ADMISSION_LIMITS
+        coalesce: Share one execution between identical concurrent requests
+            (the view's response must be a plain, non-streamed body)
+        as_json: Reject with a JSON body (for fetch() callers) or plain text
+
+    A streamed response keeps its slot until the body has been sent (or
+    the client went away), since that is when the work is done.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            gate = get_gate(name)
+
+            if not coalesce:
+                return _run_holding_slot(gate, as_json, f, args, kwargs)
+
+            def run_view():
+                response = current_app.make_response(f(*args, **kwargs))
+                return response.get_data(), response.status_code, list(response.headers.items())
+
+            try:
+                data, status, headers = gate.run(run_view, coalesce_key=name)
+            except Rejected as e:
+                return _reject_response(e, gate, as_json)
+            return current_app.response_class(data, status=status, headers=headers)
+        return decorated_function
+    return decorator
+
+
+def _run_holding_slot(gate, as_json, f, args, kwargs):
+    """Run a view in a gate slot, released when a streamed body is closed"""
+    try:
+        gate.acquire()
+    except Rejected as e:
+        return _reject_response(e, gate, as_json)
+
+    started = time.monotonic()
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            gate.release(time.monotonic() - started)
+
+    try:
+        response = current_app.make_response(f(*args, **kwargs))
+    except BaseException:
+        release()
+        raise
+    if response.is_streamed:
+        response.call_on_close(release)
+    else:
+        release()
+    return response
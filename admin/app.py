@@ -3,7 +3,10 @@ PhilanthroForge Admin Panel
 Flask application for content management
 """
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_from_directory
+import hmac
+import time
+from flask import Flask, Request, Response, render_template, request, redirect, url_for, flash, session, jsonify, g, send_from_directory, send_file, abort, stream_with_context
+from werkzeug.security import safe_join
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from config import Config
 import auth
@@ -12,10 +15,29 @@ import images as images_module
 import components as components_module
 import portfolio as portfolio_module
 import settings as settings_module
+import restore as restore_module
 import error_handler
+import metrics
+import profiler
+import io_accounting
+from admission import admission_control
+
+class AdminRequest(Request):
+    """Backup restores are allowed past the regular upload size limit"""
+    
+    @property
+    def max_content_length(self):
+        if self.endpoint == 'restore_backup':
+            return Config.MAX_RESTORE_SIZE
+        return super().max_content_length
+
+# Count filesystem and SQL work per request (before any connection is opened)
+if Config.IO_ACCOUNTING:
+    io_accounting.install()
 
 # Initialize Flask app
 app = Flask(__name__)
+app.request_class = AdminRequest
 app.config.from_object(Config)
 
 # Initialize Flask-Login
@@ -26,7 +48,15 @@ login_manager.login_message = 'Please log in to access the admin panel.'
 
 @login_manager.user_loader
 def load_user(user_id):
-    return auth.get_user_by_id(int(user_id))
+    if Config.SESSION_USER_CLAIM:
+        user = auth.user_from_session_claim(session.get('user_claim'), user_id)
+        if user:
+            return user
+    
+    user = auth.get_cached_user(int(user_id))
+    if user and Config.SESSION_USER_CLAIM:
+        session['user_claim'] = auth.make_session_claim(user)
+    return user
 
 # Create necessary folders
 os.makedirs(Config.DATA_FOLDER, exist_ok=True)
@@ -35,9 +65,15 @@ os.makedirs(Config.SERVICES_FOLDER, exist_ok=True)
 os.makedirs(Config.CASES_FOLDER, exist_ok=True)
 os.makedirs(Config.COMPONENTS_FOLDER, exist_ok=True)
 
-# Initialize database
+# Initialize database (after choosing the bcrypt cost for this machine)
+auth.calibrate_bcrypt_cost()
 auth.init_db()
 
+# Watch content and uploads so caches notice changes made outside the admin
+if Config.WATCH_ENABLED:
+    import watcher
+    watcher.start()
+
 # Register error handlers
 error_handler.register_error_handlers(app)
 error_handler.log_info("Admin panel started successfully")
@@ -72,15 +108,20 @@ def login():
         import security
         
         # Check rate limit
-        if security.check_rate_limit(email):
+        if security.check_rate_limit(email, request.remote_addr):
             error_handler.log_error(f"Rate limit exceeded for {email}")
             flash('Too many login attempts. Please try again later.', 'error')
             return render_template('admin/login.html')
         
         # Record login attempt
-        security.record_login_attempt(email)
+        security.record_login_attempt(email, request.remote_addr)
         
-        user = auth.authenticate_user(email, password)
+        try:
+            user = auth.authenticate_user(email, password)
+        except auth.LoginBusy:
+            error_handler.log_error(f"Login queue full for {email}")
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return render_template('admin/login.html'), 429
         
         if user:
             login_user(user, remember=remember)
@@ -101,6 +142,7 @@ def login():
 def logout():
     """Logout"""
     logout_user()
+    session.pop('user_claim', None)
     flash('You have been logged out.', 'info')
     return redirect(url_for('login'))
 
@@ -109,12 +151,7 @@ def logout():
 def dashboard():
     """Admin dashboard"""
     # Get stats
-    stats = {
-        'pages': count_files(Config.PAGES_FOLDER),
-        'services': count_files(Config.SERVICES_FOLDER),
-        'case_studies': count_files(Config.CASES_FOLDER),
-        'images': count_images(Config.UPLOAD_FOLDER)
-    }
+    stats = settings_module.get_system_stats()
     
     return render_template('admin/dashboard.html', stats=stats, user=current_user)
 
@@ -157,6 +194,7 @@ def edit_page(page_id):
 
 @app.route('/admin/pages/publish-all', methods=['POST'])
 @login_required
+@admission_control('publish-all', coalesce=True)
 def publish_all():
     """Publish all pages"""
     try:
@@ -187,6 +225,30 @@ def images():
     
     return render_template('admin/images.html', images=images_list, folders=folders, current_folder=folder)
 
+@app.route('/admin/api/images/analyze', methods=['GET', 'POST'])
+@login_required
+def analyze_images():
+    """Start (POST) or poll (GET) the library analysis job"""
+    import library_analysis
+    
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        return jsonify(library_analysis.start_analysis(force=bool(data.get('force'))))
+    return jsonify(library_analysis.get_status())
+
+@app.route('/admin/api/images/library')
+@login_required
+def images_library():
+    """Filter the image library by analyzed brightness and aspect"""
+    import image_index
+    
+    results = image_index.search_images(
+        brightness=request.args.get('brightness') or None,
+        aspect=request.args.get('aspect') or None,
+        sort=request.args.get('sort') or None
+    )
+    return jsonify({'results': results, 'total': len(results)})
+
 # ============================================================================
 # Unsplash API Routes
 # ============================================================================
@@ -196,14 +258,15 @@ def images():
 def search_unsplash():
     """Proxy search requests to Unsplash"""
     query = request.args.get('query', '')
-    page = request.args.get('page', 1)
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 12, type=int), 1), Config.UNSPLASH_MAX_PER_PAGE)
     
     if not query:
         return jsonify({'results': []})
     
     try:
         from unsplash import search_photos
-        data = search_photos(query, page)
+        data = search_photos(query, page, per_page)
         return jsonify(data)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -230,8 +293,64 @@ def download_unsplash():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def send_cached_file(f, mimetype, key, max_age):
+    """Send a file opened from a DiskCache (it stays readable even if evicted meanwhile)"""
+    size = os.fstat(f.fileno()).st_size
+    response = send_file(f, mimetype=mimetype, etag=key, max_age=max_age, conditional=True)
+    if response.status_code == 200:
+        response.content_length = size
+    return response
+
+@app.route('/admin/api/unsplash/thumb', methods=['GET'])
+@login_required
+def unsplash_thumb():
+    """Serve an Unsplash preview thumbnail from the local cache"""
+    import requests
+    from unsplash import get_thumbnail, ThumbnailError
+    
+    url = request.args.get('u', '')
+    try:
+        thumb, mimetype, key = get_thumbnail(url)
+    except ThumbnailError as e:
+        return jsonify({'error': str(e)}), 400
+    except requests.RequestException as e:
+        return jsonify({'error': f'Thumbnail unavailable: {e}'}), 502
+    
+    response = send_cached_file(thumb, mimetype, key, Config.THUMB_MAX_AGE)
+    response.headers['Cache-Control'] = f'private, max-age={Config.THUMB_MAX_AGE}'
+    return response
+
+@app.route('/admin/api/unsplash/import', methods=['POST'])
+@login_required
+def import_unsplash():
+    """Download several Unsplash photos concurrently"""
+    data = request.get_json(silent=True) or {}
+    photos = data.get('photos')
+    
+    if not photos or not isinstance(photos, list):
+        return jsonify({'error': 'No photos provided'}), 400
+    if len(photos) > Config.UNSPLASH_IMPORT_MAX_ITEMS:
+        return jsonify({'error': f'At most {Config.UNSPLASH_IMPORT_MAX_ITEMS} photos per import'}), 400
+    if not all(isinstance(photo, dict) and isinstance(photo.get('download_location'), str)
+               and photo['download_location'] for photo in photos):
+        return jsonify({'error': 'Each photo must be an object with a download_location'}), 400
+    
+    from unsplash import start_import
+    return jsonify(start_import(photos)), 202
+
+@app.route('/admin/api/unsplash/import/<job_id>', methods=['GET'])
+@login_required
+def import_unsplash_status(job_id):
+    """Per-item progress of a batch import"""
+    from unsplash import get_import_job
+    job = get_import_job(job_id)
+    if not job:
+        return jsonify({'error': 'Import not found'}), 404
+    return jsonify(job)
+
 @app.route('/admin/images/upload', methods=['POST'])
 @login_required
+@admission_control('upload')
 def upload_image():
     """Handle image upload"""
     if 'file' not in request.files:
@@ -308,7 +427,8 @@ def replace_image():
 def settings():
     """Settings page"""
     site_settings = settings_module.get_site_settings()
-    return render_template('admin/settings.html', settings=site_settings)
+    return render_template('admin/settings.html', settings=site_settings,
+                           snapshots=settings_module.list_backups())
 
 @app.route('/admin/settings/site', methods=['POST'])
 @login_required
@@ -396,20 +516,42 @@ def change_password():
 
 @app.route('/admin/settings/backup', methods=['GET'])
 @login_required
+@admission_control('backup', as_json=False)
 def create_backup():
     """Create and download backup"""
-    backup_path = settings_module.create_backup()
-    
-    if backup_path and os.path.exists(backup_path):
-        directory = os.path.dirname(backup_path)
-        filename = os.path.basename(backup_path)
-        return send_from_directory(directory, filename, as_attachment=True)
+    archive, download_name, mimetype = settings_module.create_backup(request.args.get('format'))
+    
+    if archive:
+        # Stream the archive as it is produced; nothing is written to disk
+        return Response(
+            stream_with_context(archive),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename="{download_name}"'}
+        )
     else:
         flash('Failed to create backup', 'error')
         return redirect(url_for('settings'))
 
+@app.route('/admin/settings/snapshots/<snapshot_id>/download', methods=['GET'])
+@login_required
+@admission_control('backup', as_json=False)
+def download_snapshot(snapshot_id):
+    """Download a stored snapshot (such as a pre-restore safety backup)"""
+    archive, download_name, mimetype = settings_module.export_snapshot(snapshot_id, request.args.get('format'))
+    
+    if archive:
+        return Response(
+            stream_with_context(archive),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename="{download_name}"'}
+        )
+    else:
+        flash('Snapshot not found', 'error')
+        return redirect(url_for('settings'))
+
 @app.route('/admin/settings/restore', methods=['POST'])
 @login_required
+@admission_control('restore', as_json=False)
 def restore_backup():
     """Restore from backup file"""
     if 'backup_file' not in request.files:
@@ -422,20 +564,12 @@ def restore_backup():
         flash('No file selected', 'error')
         return redirect(url_for('settings'))
     
-    if not file.filename.endswith('.zip'):
-        flash('Invalid file type. Please upload a ZIP file', 'error')
+    if not restore_module.is_supported(file.filename):
+        flash('Invalid file type. Please upload a .zip or .tar.zst backup', 'error')
         return redirect(url_for('settings'))
     
-    # Save uploaded file temporarily
-    temp_path = os.path.join(Config.DATA_FOLDER, 'temp_backup.zip')
-    file.save(temp_path)
-    
-    # Restore from backup
-    success, message = settings_module.restore_backup(temp_path)
-    
-    # Clean up temp file
-    if os.path.exists(temp_path):
-        os.remove(temp_path)
+    # Werkzeug has already spooled the upload; restore reads it in place
+    success, message = settings_module.restore_backup(file.stream, file.filename)
     
     flash(message, 'success' if success else 'error')
     return redirect(url_for('settings'))
@@ -447,6 +581,43 @@ def api_stats():
     stats = settings_module.get_system_stats()
     return jsonify(stats)
 
+@app.route('/admin/api/metrics')
+def api_metrics():
+    """Request metrics in Prometheus text format, or JSON with ?format=json"""
+    token = request.headers.get('Authorization', '')
+    scraper = bool(Config.METRICS_TOKEN) and hmac.compare_digest(token, f'Bearer {Config.METRICS_TOKEN}')
+    if not (scraper or current_user.is_authenticated):
+        return login_manager.unauthorized()
+    
+    if request.args.get('format') == 'json':
+        return jsonify(metrics.get_metrics())
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/api/profiles')
+@login_required
+def api_profiles():
+    """List stored request profiles, newest first"""
+    return jsonify(profiler.list_profiles())
+
+@app.route('/admin/api/profiles/<profile_id>')
+@login_required
+def api_profile(profile_id):
+    """Top functions of a stored profile (?top=N)"""
+    summary = profiler.get_profile(profile_id, limit=request.args.get('top', type=int))
+    if summary is None:
+        abort(404)
+    return jsonify(summary)
+
+@app.route('/admin/api/profiles/<profile_id>/download')
+@login_required
+def download_profile(profile_id):
+    """Raw profile, readable with pstats or snakeviz"""
+    path = profiler.profile_path(profile_id)
+    if path is None:
+        abort(404)
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f'{profile_id}.prof')
+
 @app.route('/admin/components')
 @login_required
 def components_list():
@@ -594,21 +765,6 @@ def delete_case_study(case_id):
 # Helper Functions
 # ============================================================================
 
-def count_files(folder):
-    """Count JSON files in a folder"""
-    if not os.path.exists(folder):
-        return 0
-    return len([f for f in os.listdir(folder) if f.endswith('.json')])
-
-def count_images(folder):
-    """Count images recursively"""
-    if not os.path.exists(folder):
-        return 0
-    count = 0
-    for root, dirs, files in os.walk(folder):
-        count += len([f for f in files if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp'))])
-    return count
-
 def get_all_pages():
     """Get list of all pages"""
     pages = []
@@ -654,18 +810,114 @@ def get_subfolders(folder_path):
 @app.route('/assets/<path:filename>')
 def serve_assets(filename):
     """Serve static files from assets directory"""
+    # Resized/re-encoded derivative requested (?w=640&fmt=webp&q=auto)
+    if any(param in request.args for param in ('w', 'fmt', 'q')):
+        return serve_derivative(filename)
+    
+    # Serve the precompressed variant of SVGs when the browser accepts gzip,
+    # unless the SVG was changed (e.g. outside the admin) after it was written
+    if filename.lower().endswith('.svg') and 'gzip' in request.accept_encodings:
+        svgz = images_module.precompressed_path(filename)
+        svg_path = safe_join(Config.UPLOAD_FOLDER, filename)
+        try:
+            fresh = svg_path and os.stat(images_module.precompressed_path(svg_path)).st_mtime_ns >= os.stat(svg_path).st_mtime_ns
+        except OSError:
+            fresh = False
+        if fresh:
+            response = send_from_directory(Config.UPLOAD_FOLDER, svgz, mimetype='image/svg+xml')
+            response.headers['Content-Encoding'] = 'gzip'
+            response.headers['Vary'] = 'Accept-Encoding'
+            return response
     return send_from_directory(Config.UPLOAD_FOLDER, filename)
 
+def serve_derivative(filename):
+    """Serve a cached derivative of an uploaded image, rendering it once"""
+    import derivatives
+    
+    full_path = safe_join(Config.UPLOAD_FOLDER, filename)
+    if not full_path or not os.path.isfile(full_path):
+        abort(404)
+    
+    # Vector and unsupported files are served as-is
+    if not full_path.lower().endswith(derivatives.SOURCE_EXTENSIONS):
+        return send_from_directory(Config.UPLOAD_FOLDER, filename)
+    
+    try:
+        width, fmt, quality = derivatives.parse_params(
+            request.args,
+            accept_webp='image/webp' in request.headers.get('Accept', ''),
+            source_ext=os.path.splitext(full_path)[1]
+        )
+    except derivatives.DerivativeError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    derivative, mimetype, key = derivatives.get_derivative(full_path, width, fmt, quality)
+    
+    # The ETag is the content-addressed key, so revalidation is cheap
+    response = send_cached_file(derivative, mimetype, key, Config.DERIVATIVE_MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={Config.DERIVATIVE_MAX_AGE}'
+    if (request.args.get('fmt') or 'auto') == 'auto':
+        response.headers['Vary'] = 'Accept'
+    return response
+
 # ============================================================================
-# Security Headers
+# Security Headers and Request Metrics
 # ============================================================================
 
+@app.before_request
+def start_request_metrics():
+    g.metrics_started = metrics.request_started(request.endpoint)
+    if Config.PROFILE_SAMPLE_RATE or Config.PROFILE_SECRET:
+        g.profile = profiler.start(request)
+    if Config.IO_ACCOUNTING:
+        g.io_token = io_accounting.start()
+
 @app.after_request
 def add_security_headers(response):
     """Add security headers to all responses"""
     import security
     return security.add_security_headers(response)
 
+@app.after_request
+def record_request_metrics(response):
+    """Record latency (to the response headers for streamed bodies), status and size"""
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        metrics.request_finished(request.endpoint, started, response.status_code, response.content_length)
+        active = g.pop('profile', None)
+        if active:
+            profiler.finish(active, request, response.status_code, time.perf_counter() - started)
+    return response
+
+@app.after_request
+def report_request_io(response):
+    """Server-Timing header with the request's I/O counts; log slow requests"""
+    started = g.get('metrics_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    token = g.pop('io_token', None)
+    counters = io_accounting.stop(token) if token is not None else None
+    if counters:
+        response.headers['Server-Timing'] = io_accounting.server_timing(counters, elapsed)
+    if elapsed * 1000 >= Config.SLOW_REQUEST_MS:
+        error_handler.log_slow_request(request.method, request.path, response.status_code, elapsed * 1000,
+                                       io_accounting.describe(counters) if counters else None)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    # Requests that failed without reaching after_request
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        metrics.request_finished(request.endpoint, started, 500, None)
+    active = g.pop('profile', None)
+    if active:
+        profiler.cancel(active)
+    token = g.pop('io_token', None)
+    if token is not None:
+        io_accounting.stop(token)
+
 
 # ============================================================================
 # Run Application
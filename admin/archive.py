@@ -0,0 +1,284 @@
+"""
+Archive Module
+Backup archives compressed on all cores: members are deflated in parallel
+and assembled into a standard ZIP in order, or written as a zstd-compressed
+tar when the zstandard package is installed
+"""
+import io
+import json
+import time
+import zlib
+import struct
+import tarfile
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from backup_store import STORED_EXTENSIONS
+
+# Small, highly compressible text gets the strongest level
+TEXT_EXTENSIONS = ('.json', '.html', '.htm', '.svg', '.css', '.js', '.txt', '.md', '.xml', '.csv')
+LARGE_FILE_SIZE = 16 * 1024 * 1024
+CHUNK_SIZE = 256 * 1024
+SPOOL_SIZE = 1024 * 1024  # compressed members larger than this wait on disk, not in memory
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+ZIP_LIMIT = 0xFFFFFFFF  # beyond this (or 65535 members) ZIP64 would be needed
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def zstd_available():
+    try:
+        import zstandard  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def needs_zip64(members):
+    """Whether members exceed what the assembler's plain ZIP format can hold"""
+    return len(members) >= 0xFFFF or sum(m[2] for m in members) >= ZIP_LIMIT
+
+
+def compression_level(arcname, size):
+    """Deflate level for a member, or None to store it uncompressed"""
+    name = arcname.lower()
+    if name.endswith(STORED_EXTENSIONS):
+        return None
+    if name.endswith(TEXT_EXTENSIONS):
+        return 9
+    if size > LARGE_FILE_SIZE:
+        return 3
+    return 6
+
+
+def deflate_file(path, level):
+    """
+    Pool task: raw-deflate a file into a spooled temporary file
+
+    Returns:
+        tuple: (crc32, uncompressed size, compressed size, spool positioned at 0)
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    crc, size = 0, 0
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+                spool.write(compressor.compress(chunk))
+        spool.write(compressor.flush())
+    except BaseException:
+        spool.close()
+        raise
+    compressed_size = spool.tell()
+    spool.seek(0)
+    return crc, size, compressed_size, spool
+
+
+def _discard(future):
+    """Cancel a queued deflate, or close the spool of one that already finished"""
+    if future.cancel():
+        return
+    try:
+        future.result()[3].close()
+    except Exception:
+        pass
+
+
+def _get_pool():
+    """
+    Compression pool shared by archive builds
+
+    zlib releases the GIL while deflating and computing CRCs, so threads
+    use every core without forking the (multi-threaded) server process.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=Config.BACKUP_WORKERS, thread_name_prefix='archive')
+        return _pool
+
+
+def _dos_datetime(mtime_ns):
+    t = time.localtime(max(mtime_ns / 1e9, 315532800))  # ZIP dates start in 1980
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+class ZipAssembler:
+    """Writes ZIP structures for members whose data is produced elsewhere"""
+
+    UTF8 = 0x0800
+    DESCRIPTOR = 0x0008
+
+    def __init__(self):
+        self.offset = 0
+        self.central = []
+
+    def _emit(self, data):
+        self.offset += len(data)
+        return data
+
+    def local_header(self, name, method, dos_time, dos_date, crc=0, csize=0, usize=0, descriptor=False):
+        encoded = name.encode('utf-8')
+        flags = self.UTF8 | (self.DESCRIPTOR if descriptor else 0)
+        self.central.append([encoded, flags, method, dos_time, dos_date, crc, csize, usize, self.offset])
+        return self._emit(struct.pack('<IHHHHHIIIHH', 0x04034b50, 20, flags, method, dos_time, dos_date,
+                                      crc, csize, usize, len(encoded), 0) + encoded)
+
+    def data(self, chunk):
+        return self._emit(chunk)
+
+    def descriptor(self, crc, csize, usize):
+        """Close a streamed member, recording its sizes for the central directory"""
+        self.central[-1][5:8] = [crc, csize, usize]
+        return self._emit(struct.pack('<IIII', 0x08074b50, crc, csize, usize))
+
+    def finish(self):
+        """Central directory and end record"""
+        start = self.offset
+        records = []
+        for encoded, flags, method, dos_time, dos_date, crc, csize, usize, offset in self.central:
+            records.append(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, 20, 20, flags, method, dos_time, dos_date,
+                                       crc, csize, usize, len(encoded), 0, 0, 0, 0, 0, offset) + encoded)
+        directory = b''.join(records)
+        end = struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, len(self.central), len(self.central),
+                          len(directory), start, 0)
+        return self._emit(directory + end)
+
+
+def _stored_member(assembler, arcname, path, dos_time, dos_date):
+    """Stream a member without compression, with its CRC in a trailing descriptor"""
+    yield assembler.local_header(arcname, ZIP_STORED, dos_time, dos_date, descriptor=True)
+    crc, size = 0, 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            yield assembler.data(chunk)
+    yield assembler.descriptor(crc, size, size)
+
+
+def stream_parallel_zip(members, manifest):
+    """
+    Yield a ZIP archive whose deflated members are compressed in parallel
+    (at most 2 x BACKUP_WORKERS files in flight, each held in memory only
+    up to SPOOL_SIZE)
+
+    Args:
+        members: list of (arcname, path, size, mtime_ns)
+        manifest: dict written last as manifest.json, with timings added
+
+    Yields:
+        bytes
+    """
+    started = time.perf_counter()
+    timings = manifest.setdefault('timings', {})
+    compress_wait = 0.0
+    pool = _get_pool()
+    assembler = ZipAssembler()
+    window = deque()
+    pending = iter(members)
+
+    def submit_next():
+        for arcname, path, size, mtime in pending:
+            level = compression_level(arcname, size)
+            future = pool.submit(deflate_file, path, level) if level is not None else None
+            window.append((arcname, path, mtime, future))
+            return True
+        return False
+
+    for _ in range(Config.BACKUP_WORKERS * 2):
+        if not submit_next():
+            break
+
+    try:
+        while window:
+            arcname, path, mtime, future = window.popleft()
+            submit_next()
+            dos_time, dos_date = _dos_datetime(mtime)
+
+            if future is None:
+                yield from _stored_member(assembler, arcname, path, dos_time, dos_date)
+                continue
+
+            waited = time.perf_counter()
+            crc, usize, csize, spool = future.result()
+            compress_wait += time.perf_counter() - waited
+            with spool:
+                yield assembler.local_header(arcname, ZIP_DEFLATED, dos_time, dos_date, crc, csize, usize)
+                for chunk in iter(lambda: spool.read(CHUNK_SIZE), b''):
+                    yield assembler.data(chunk)
+    finally:
+        # Download abandoned: don't leave queued work in the pool or spools open
+        for _, _, _, future in window:
+            if future is not None:
+                _discard(future)
+
+    timings['compress_wait'] = round(compress_wait, 3)
+    timings['archive'] = round(time.perf_counter() - started, 3)
+    manifest_bytes = json.dumps(manifest, indent=2).encode('utf-8')
+    dos_time, dos_date = _dos_datetime(time.time_ns())
+    compressed = zlib.compress(manifest_bytes, 9)[2:-4]  # raw deflate
+    yield assembler.local_header('manifest.json', ZIP_DEFLATED, dos_time, dos_date,
+                                 zlib.crc32(manifest_bytes), len(compressed), len(manifest_bytes))
+    yield assembler.data(compressed)
+    yield assembler.finish()
+
+
+class _Pipe(io.RawIOBase):
+    """Write end collecting compressed output for the generator to drain"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_tar_zst(members, manifest):
+    """
+    Yield a zstd-compressed tar (zstd compresses on all cores itself)
+
+    Args:
+        members: list of (arcname, path, size, mtime_ns)
+        manifest: dict written last as manifest.json, with timings added
+    """
+    import zstandard
+
+    started = time.perf_counter()
+    pipe = _Pipe()
+    compressor = zstandard.ZstdCompressor(level=Config.BACKUP_ZSTD_LEVEL, threads=-1)
+    writer = compressor.stream_writer(pipe, closefd=False)
+    with tarfile.open(fileobj=writer, mode='w|') as tar:
+        for arcname, path, size, mtime in members:
+            info = tarfile.TarInfo(arcname)
+            info.size = size
+            info.mtime = mtime / 1e9
+            with open(path, 'rb') as f:
+                tar.addfile(info, f)
+            if pipe.chunks:
+                yield pipe.drain()
+
+        manifest.setdefault('timings', {})['archive'] = round(time.perf_counter() - started, 3)
+        manifest_bytes = json.dumps(manifest, indent=2).encode('utf-8')
+        info = tarfile.TarInfo('manifest.json')
+        info.size = len(manifest_bytes)
+        info.mtime = time.time()
+        tar.addfile(info, io.BytesIO(manifest_bytes))
+    writer.close()
+    yield pipe.drain()
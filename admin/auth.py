@@ -2,10 +2,50 @@
 Authentication Module
 Handles user authentication, password hashing, and session management
 """
-import sqlite3
+import time
+import queue
+import atexit
+import threading
+from datetime import datetime, timezone
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
 import bcrypt
 from flask_login import UserMixin
 from config import Config
+import db
+
+# Common lookups, compiled once per connection (email is UNIQUE, so indexed)
+SELECT_USER_BY_ID = 'SELECT id, email FROM users WHERE id = ?'
+SELECT_USER_BY_EMAIL = 'SELECT id, email FROM users WHERE email = ?'
+SELECT_USER_LOGIN = 'SELECT id, email, password_hash FROM users WHERE email = ?'
+SELECT_PASSWORD_HASH = 'SELECT password_hash FROM users WHERE id = ?'
+UPDATE_LAST_LOGIN = 'UPDATE users SET last_login = ? WHERE id = ?'
+UPDATE_PASSWORD_HASH = 'UPDATE users SET password_hash = ? WHERE id = ?'
+# Rehash on login: only applies if the password hasn't changed since it was read
+UPGRADE_PASSWORD_HASH = 'UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?'
+
+# Calibration times this cheap cost and extrapolates (each round doubles the time)
+CALIBRATION_ROUNDS = 8
+CALIBRATION_SAMPLES = 5
+
+# Password checks run on a small dedicated pool so login bursts can't tie up every worker
+_password_executor = ThreadPoolExecutor(max_workers=Config.PASSWORD_WORKERS, thread_name_prefix='password')
+_password_slots = threading.BoundedSemaphore(Config.PASSWORD_WORKERS + Config.PASSWORD_QUEUE_LIMIT)
+_bcrypt_rounds = Config.BCRYPT_ROUNDS or 12
+
+# Non-critical writes (last_login, rehashes) applied by a background thread
+_writes = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+
+# Users loaded for recent requests: id -> (expires_at, User)
+_user_cache = {}
+# Time each user's cached state and session claims were last invalidated
+_invalidated_at = {}
+_cache_lock = threading.Lock()
+
+class LoginBusy(Exception):
+    """Raised when too many password checks are already queued"""
 
 class User(UserMixin):
     def __init__(self, id, email):
@@ -14,49 +54,123 @@ class User(UserMixin):
 
 def init_db():
     """Initialize the database with users table"""
-    conn = sqlite3.connect(Config.DATABASE)
-    cursor = conn.cursor()
+    with db.transaction() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                email TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_login TIMESTAMP
+            )
+        ''')
+        
+        # Create default admin user if doesn't exist
+        cursor.execute('SELECT COUNT(*) FROM users WHERE email = ?', (Config.DEFAULT_ADMIN_EMAIL,))
+        if cursor.fetchone()[0] == 0:
+            password_hash = hash_password(Config.DEFAULT_ADMIN_PASSWORD)
+            cursor.execute(
+                'INSERT INTO users (email, password_hash) VALUES (?, ?)',
+                (Config.DEFAULT_ADMIN_EMAIL, password_hash)
+            )
+            print(f"✅ Default admin user created: {Config.DEFAULT_ADMIN_EMAIL}")
+            print(f"   Password: {Config.DEFAULT_ADMIN_PASSWORD}")
+            print("   ⚠️  CHANGE THIS PASSWORD IMMEDIATELY!")
+
+def calibrate_bcrypt_cost():
+    """
+    Pick the bcrypt cost whose hashing time is closest to BCRYPT_TARGET_MS
+    without exceeding it on this machine, never below BCRYPT_MIN_ROUNDS
+    
+    The time per round is the median of several samples at a cheap cost,
+    so one slow or fast sample can't skew the choice.
+    
+    Returns:
+        int: cost used for new hashes
+    """
+    global _bcrypt_rounds
+    if Config.BCRYPT_ROUNDS:
+        _bcrypt_rounds = Config.BCRYPT_ROUNDS
+        return _bcrypt_rounds
     
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_login TIMESTAMP
-        )
-    ''')
+    samples = []
+    for _ in range(CALIBRATION_SAMPLES):
+        started = time.perf_counter()
+        bcrypt.hashpw(b'calibration', bcrypt.gensalt(CALIBRATION_ROUNDS))
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
     
-    # Create default admin user if doesn't exist
-    cursor.execute('SELECT COUNT(*) FROM users WHERE email = ?', (Config.DEFAULT_ADMIN_EMAIL,))
-    if cursor.fetchone()[0] == 0:
-        password_hash = hash_password(Config.DEFAULT_ADMIN_PASSWORD)
-        cursor.execute(
-            'INSERT INTO users (email, password_hash) VALUES (?, ?)',
-            (Config.DEFAULT_ADMIN_EMAIL, password_hash)
-        )
-        print(f"✅ Default admin user created: {Config.DEFAULT_ADMIN_EMAIL}")
-        print(f"   Password: {Config.DEFAULT_ADMIN_PASSWORD}")
-        print("   ⚠️  CHANGE THIS PASSWORD IMMEDIATELY!")
+    rounds = Config.BCRYPT_MIN_ROUNDS
+    elapsed_ms = samples[len(samples) // 2] * 2 ** (rounds - CALIBRATION_ROUNDS)
+    while rounds < Config.BCRYPT_MAX_ROUNDS and elapsed_ms * 2 <= Config.BCRYPT_TARGET_MS:
+        rounds += 1
+        elapsed_ms *= 2
     
-    conn.commit()
-    conn.close()
+    _bcrypt_rounds = rounds
+    return rounds
 
 def hash_password(password):
-    """Hash a password using bcrypt"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    """Hash a password using bcrypt at the calibrated cost"""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(_bcrypt_rounds)).decode('utf-8')
 
 def verify_password(password, password_hash):
     """Verify a password against its hash"""
     return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
 
+def hash_cost(password_hash):
+    """Cost factor of a bcrypt hash ($2b$<cost>$...)"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+def _run_password_task(fn, *args):
+    """
+    Run a bcrypt call on the password pool and wait for it
+    
+    Raises:
+        LoginBusy: if the pool's queue is full or the check times out
+    """
+    if not _password_slots.acquire(blocking=False):
+        raise LoginBusy('Too many logins in progress')
+    try:
+        return _password_executor.submit(fn, *args).result(timeout=Config.PASSWORD_TIMEOUT)
+    except futures.TimeoutError:
+        raise LoginBusy('Password check timed out')
+    finally:
+        _password_slots.release()
+
+def _write_loop():
+    while True:
+        sql, params = _writes.get()
+        try:
+            db.execute(sql, params)
+        except Exception as e:
+            print(f"Deferred database write failed: {e}")
+        finally:
+            _writes.task_done()
+
+def write_behind(sql, params):
+    """Queue a write that the request doesn't need to wait for"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_loop, daemon=True, name='db-writer')
+            _writer.start()
+    _writes.put((sql, params))
+
+def flush_writes():
+    """Wait for queued writes to be applied"""
+    if _writer is not None:
+        _writes.join()
+
+atexit.register(flush_writes)
+
 def get_user_by_email(email):
     """Retrieve user by email"""
-    conn = sqlite3.connect(Config.DATABASE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, email FROM users WHERE email = ?', (email,))
-    row = cursor.fetchone()
-    conn.close()
+    row = db.query_one(SELECT_USER_BY_EMAIL, (email,))
     
     if row:
         return User(id=row[0], email=row[1])
@@ -64,39 +178,86 @@ def get_user_by_email(email):
 
 def get_user_by_id(user_id):
     """Retrieve user by ID"""
-    conn = sqlite3.connect(Config.DATABASE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, email FROM users WHERE id = ?', (user_id,))
-    row = cursor.fetchone()
-    conn.close()
+    row = db.query_one(SELECT_USER_BY_ID, (user_id,))
     
     if row:
         return User(id=row[0], email=row[1])
     return None
 
+def get_cached_user(user_id):
+    """Retrieve user by ID, reusing a recent lookup for up to USER_CACHE_TTL seconds"""
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _user_cache.get(user_id)
+        if entry and entry[0] > now:
+            return entry[1]
+    
+    user = get_user_by_id(user_id)
+    if user:
+        with _cache_lock:
+            _user_cache[user_id] = (now + Config.USER_CACHE_TTL, user)
+    return user
+
+def invalidate_user(user_id):
+    """Drop a user's cached object and any session claims issued so far"""
+    with _cache_lock:
+        _user_cache.pop(user_id, None)
+        _invalidated_at[user_id] = time.time()
+
+def make_session_claim(user):
+    """Claim stored in the (signed) session cookie identifying a loaded user"""
+    return {'id': user.id, 'email': user.email, 'iat': time.time()}
+
+def user_from_session_claim(claim, user_id):
+    """
+    Build the user from a session claim without touching the database
+    
+    Returns:
+        User, or None if the claim is missing, for another user, expired
+        or issued before the user was last invalidated
+    """
+    if not isinstance(claim, dict) or str(claim.get('id')) != str(user_id):
+        return None
+    issued_at = claim.get('iat', 0)
+    if time.time() - issued_at > Config.SESSION_CLAIM_MAX_AGE:
+        return None
+    with _cache_lock:
+        if issued_at <= _invalidated_at.get(claim['id'], 0):
+            return None
+    return User(id=claim['id'], email=claim['email'])
+
+def get_password_hash(user_id):
+    """Retrieve a user's password hash (None if the user doesn't exist)"""
+    row = db.query_one(SELECT_PASSWORD_HASH, (user_id,))
+    return row[0] if row else None
+
 def authenticate_user(email, password):
-    """Authenticate user with email and password"""
-    conn = sqlite3.connect(Config.DATABASE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, email, password_hash FROM users WHERE email = ?', (email,))
-    row = cursor.fetchone()
+    """
+    Authenticate user with email and password
+    
+    Raises:
+        LoginBusy: if too many password checks are already queued
+    """
+    row = db.query_one(SELECT_USER_LOGIN, (email,))
     
-    if row and verify_password(password, row[2]):
+    if row and _run_password_task(verify_password, password, row[2]):
+        # Upgrade hashes made at a lower cost while we have the password
+        # (conditional on the old hash, so it can't undo a password change)
+        cost = hash_cost(row[2])
+        if cost is not None and cost < _bcrypt_rounds:
+            new_hash = _run_password_task(hash_password, password)
+            write_behind(UPGRADE_PASSWORD_HASH, (new_hash, row[0], row[2]))
+        
         # Update last login
-        cursor.execute('UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?', (row[0],))
-        conn.commit()
-        conn.close()
+        now = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        write_behind(UPDATE_LAST_LOGIN, (now, row[0]))
         return User(id=row[0], email=row[1])
     
-    conn.close()
     return None
 
 def update_password(user_id, new_password):
     """Update user password"""
     password_hash = hash_password(new_password)
-    conn = sqlite3.connect(Config.DATABASE)
-    cursor = conn.cursor()
-    cursor.execute('UPDATE users SET password_hash = ? WHERE id = ?', (password_hash, user_id))
-    conn.commit()
-    conn.close()
+    db.execute(UPDATE_PASSWORD_HASH, (password_hash, user_id))
+    invalidate_user(user_id)
     return True
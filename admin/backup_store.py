@@ -0,0 +1,261 @@
+"""
+Backup Store Module
+Content-addressed snapshots of the data and uploads folders: each distinct
+file is stored once under its SHA-256, and a snapshot is a manifest of hashes
+"""
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import zipfile
+import threading
+from datetime import datetime, timedelta
+from config import Config
+
+# Already-compressed formats are stored in archives rather than deflated again
+STORED_EXTENSIONS = ('.jpg', '.jpeg', '.webp', '.png', '.gif', '.svgz', '.zip', '.gz', '.zst')
+STREAM_CHUNK_SIZE = 256 * 1024
+SNAPSHOT_ID = re.compile(r'^\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}_\d{6}$')
+
+_lock = threading.Lock()
+
+
+def _objects_folder():
+    return os.path.join(Config.BACKUP_FOLDER, 'objects')
+
+
+def _snapshots_folder():
+    return os.path.join(Config.BACKUP_FOLDER, 'snapshots')
+
+
+def object_path(digest):
+    """Where the contents with a given hash are stored"""
+    return os.path.join(_objects_folder(), digest[:2], digest)
+
+
+def backup_roots():
+    """Folders included in snapshots, keyed by their name inside archives"""
+    return {
+        os.path.basename(Config.DATA_FOLDER): Config.DATA_FOLDER,
+        os.path.basename(Config.UPLOAD_FOLDER): Config.UPLOAD_FOLDER
+    }
+
+
+def iter_live_files():
+    """Yield (arcname, absolute path, stat) for every file under the backup roots"""
+    for prefix, root in backup_roots().items():
+        pending = [root]
+        while pending:
+            folder = pending.pop()
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            rel = os.path.relpath(entry.path, root).replace(os.sep, '/')
+                            yield f'{prefix}/{rel}', entry.path, entry.stat()
+            except OSError:
+                pass
+
+
+def hash_file(full_path):
+    """SHA-256 of a file's contents"""
+    sha = hashlib.sha256()
+    with open(full_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _store_object(full_path, digest):
+    """Copy a file into the object store unless its contents are already there"""
+    target = object_path(digest)
+    if os.path.exists(target):
+        return False
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temp_path = f"{target}.{threading.get_ident()}.tmp"
+    shutil.copyfile(full_path, temp_path)
+    os.replace(temp_path, target)
+    return True
+
+
+def list_snapshots():
+    """Snapshot manifests (without their file lists), newest first"""
+    snapshots = []
+    try:
+        names = os.listdir(_snapshots_folder())
+    except OSError:
+        return snapshots
+    for name in sorted(names, reverse=True):
+        if name.endswith('.json'):
+            manifest = get_snapshot(name[:-5])
+            if manifest:
+                manifest.pop('files', None)
+                snapshots.append(manifest)
+    return snapshots
+
+
+def get_snapshot(snapshot_id):
+    """Full manifest of a snapshot, or None"""
+    if not SNAPSHOT_ID.match(snapshot_id or ''):
+        return None
+    try:
+        with open(os.path.join(_snapshots_folder(), f'{snapshot_id}.json'), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def create_snapshot(label='manual'):
+    """
+    Record the current data and uploads as a snapshot
+
+    Files whose size and mtime match the previous snapshot reuse its hash
+    without being read; only new contents are copied into the store.
+
+    Args:
+        label: Why the snapshot was taken ('manual', 'pre-restore', ...)
+
+    Returns:
+        dict: the snapshot manifest (files maps arcname -> hash, size, mtime)
+    """
+    with _lock:
+        previous = list_snapshots()
+        previous_files = (get_snapshot(previous[0]['id']) or {}).get('files', {}) if previous else {}
+
+        files, stored, stored_bytes = {}, 0, 0
+        for arcname, full_path, stat in iter_live_files():
+            known = previous_files.get(arcname)
+            if known and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime_ns \
+                    and os.path.exists(object_path(known['hash'])):
+                digest = known['hash']
+            else:
+                digest = hash_file(full_path)
+                if _store_object(full_path, digest):
+                    stored += 1
+                    stored_bytes += stat.st_size
+            files[arcname] = {'hash': digest, 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+        now = datetime.now()
+        snapshot_id = now.strftime('%Y-%m-%d_%H-%M-%S_%f')
+        manifest = {
+            'id': snapshot_id,
+            'backup_date': now.strftime('%Y-%m-%d_%H-%M-%S'),
+            'label': label,
+            'version': '2.0',
+            'file_count': len(files),
+            'total_size': sum(f['size'] for f in files.values()),
+            'new_objects': stored,
+            'new_bytes': stored_bytes,
+            'files': files
+        }
+
+        os.makedirs(_snapshots_folder(), exist_ok=True)
+        manifest_path = os.path.join(_snapshots_folder(), f'{snapshot_id}.json')
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    apply_retention()
+    return manifest
+
+
+def apply_retention():
+    """
+    Drop snapshots outside the retention policy and objects no snapshot uses
+
+    Keeps the newest BACKUP_KEEP_LAST snapshots plus the newest snapshot of
+    each of the last BACKUP_KEEP_DAILY days.
+
+    Returns:
+        dict with the number of snapshots and objects removed
+    """
+    with _lock:
+        snapshots = list_snapshots()
+        keep = {s['id'] for s in snapshots[:Config.BACKUP_KEEP_LAST]}
+
+        cutoff = datetime.now() - timedelta(days=Config.BACKUP_KEEP_DAILY)
+        days_seen = set()
+        for snapshot in snapshots:
+            taken = datetime.strptime(snapshot['backup_date'], '%Y-%m-%d_%H-%M-%S')
+            if taken >= cutoff and taken.date() not in days_seen:
+                days_seen.add(taken.date())
+                keep.add(snapshot['id'])
+
+        removed = 0
+        for snapshot in snapshots:
+            if snapshot['id'] not in keep:
+                os.remove(os.path.join(_snapshots_folder(), f"{snapshot['id']}.json"))
+                removed += 1
+
+        if not removed:
+            return {'snapshots': 0, 'objects': 0}
+
+        referenced = set()
+        for snapshot_id in keep:
+            referenced.update(f['hash'] for f in (get_snapshot(snapshot_id) or {}).get('files', {}).values())
+
+        removed_objects = 0
+        for shard in os.scandir(_objects_folder()):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name not in referenced:
+                    os.remove(entry.path)
+                    removed_objects += 1
+
+        return {'snapshots': removed, 'objects': removed_objects}
+
+
+class _StreamBuffer:
+    """Write-only file object whose contents are drained by the zip generator"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_zip(snapshot, manifest):
+    """
+    Yield a ZIP archive of a snapshot piece by piece, without a temporary file
+
+    Members are read from the object store in chunks, so memory stays flat
+    whatever the archive size. manifest.json is written last.
+
+    Args:
+        snapshot: Snapshot manifest from create_snapshot()
+        manifest: dict written to manifest.json
+
+    Yields:
+        bytes
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for arcname, entry in snapshot['files'].items():
+            info = zipfile.ZipInfo(arcname, time.localtime(entry['mtime'] / 1e9)[:6])
+            info.compress_type = zipfile.ZIP_STORED if arcname.lower().endswith(STORED_EXTENSIONS) else zipfile.ZIP_DEFLATED
+            info.file_size = entry['size']
+            
+            with open(object_path(entry['hash']), 'rb') as src, zipf.open(info, 'w', force_zip64=entry['size'] > 2 ** 31) as dest:
+                for chunk in iter(lambda: src.read(STREAM_CHUNK_SIZE), b''):
+                    dest.write(chunk)
+                    if buffer.chunks:
+                        yield buffer.drain()
+            yield buffer.drain()
+
+        zipf.writestr('manifest.json', json.dumps(manifest, indent=2))
+    yield buffer.drain()
@@ -21,6 +21,30 @@ class Config:
     MAX_CONTENT_LENGTH = 5 * 1024 * 1024  # 5MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'svg', 'webp'}
     
+    # Image optimization
+    IMAGE_QUALITY_THRESHOLD = 38  # Minimum PSNR (dB) for lossy re-encodes
+    IMAGE_ENCODER_WORKERS = 4  # Candidate encodings tried in parallel
+    SVG_PRECISION = 3  # Decimal places kept in SVG coordinates
+    
+    # On-demand image derivatives (/assets/<path>?w=640&fmt=webp&q=auto)
+    CACHE_FOLDER = os.path.join(os.path.dirname(__file__), 'cache')
+    DERIVATIVE_CACHE_FOLDER = os.path.join(CACHE_FOLDER, 'derivatives')
+    DERIVATIVE_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 512MB
+    DERIVATIVE_WIDTHS = (160, 320, 480, 640, 768, 960, 1280, 1600, 1920)
+    DERIVATIVE_AUTO_QUALITY = 80
+    DERIVATIVE_QUALITIES = (50, 65, 80, 90)  # Explicit q values allowed besides 'auto'
+    DERIVATIVE_MAX_AGE = 24 * 3600  # Browser cache lifetime (seconds)
+    
+    # Image metadata index (dimensions, placeholders)
+    IMAGE_INDEX_FILE = os.path.join(CACHE_FOLDER, 'image_index.json')
+    PLACEHOLDER_SIZE = 16  # Longest side of the blurred placeholder (px)
+    EAGER_IMAGES = 1  # Images per page loaded eagerly (hero); the rest are lazy
+    
+    # Library analysis job
+    ANALYSIS_BATCH_SIZE = 32  # Images loaded into each NumPy batch
+    ANALYSIS_DARK_THRESHOLD = 0.35  # Mean brightness (0-1) below this is "dark"
+    ANALYSIS_LIGHT_THRESHOLD = 0.65  # Mean brightness (0-1) above this is "light"
+    
     # Content data folders
     DATA_FOLDER = os.path.join(os.path.dirname(__file__), 'data')
     PAGES_FOLDER = os.path.join(DATA_FOLDER, 'pages')
@@ -30,6 +54,84 @@ class Config:
     
     # Database
     DATABASE = os.path.join(os.path.dirname(__file__), 'users.db')
+    DATABASE_BUSY_TIMEOUT_MS = 5000  # Wait this long for a lock before failing
+    DATABASE_CACHE_KB = 2048  # Page cache per connection
+    DATABASE_STATEMENT_CACHE = 64  # Compiled statements kept per connection
+    DATABASE_POOL_SIZE = 4  # Idle connections kept open per database file
+    USER_CACHE_TTL = 60  # Seconds a loaded user is reused across requests
+    
+    # Trust a signed user claim in the session cookie instead of loading the user
+    SESSION_USER_CLAIM = os.environ.get('SESSION_USER_CLAIM', '').lower() in ('1', 'true', 'yes')
+    SESSION_CLAIM_MAX_AGE = 300  # Seconds before a claim is re-checked against the database
+    
+    # Password hashing (bcrypt cost is calibrated at startup unless BCRYPT_ROUNDS is set)
+    BCRYPT_ROUNDS = int(os.environ['BCRYPT_ROUNDS']) if os.environ.get('BCRYPT_ROUNDS') else None
+    BCRYPT_TARGET_MS = 250  # Aim for this verification time per login
+    BCRYPT_MIN_ROUNDS = 12  # Never below the cost hashes were made with before calibration
+    BCRYPT_MAX_ROUNDS = 14
+    PASSWORD_WORKERS = 2  # Threads verifying passwords
+    PASSWORD_QUEUE_LIMIT = 8  # Logins allowed to wait for a worker before answering 429
+    PASSWORD_TIMEOUT = 10  # Seconds a login waits for its verification
+    
+    # Login rate limiting (sliding window, per email and per client IP)
+    LOGIN_RATE_WINDOW = 900  # 15 minutes in seconds
+    LOGIN_MAX_ATTEMPTS = 5  # Per email
+    LOGIN_MAX_ATTEMPTS_PER_IP = 20
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')  # 'sqlite' shares counts between workers
+    RATE_LIMIT_DATABASE = os.path.join(CACHE_FOLDER, 'rate_limits.db')
+    RATE_LIMIT_MAX_KEYS = 10000  # Least recently used keys beyond this are dropped
+    
+    # Admission control for heavy endpoints (running at once / allowed to wait)
+    ADMISSION_LIMITS = {
+        'publish-all': {'concurrency': 1, 'queue': 2},
+        'backup': {'concurrency': 1, 'queue': 1},
+        'restore': {'concurrency': 1, 'queue': 0},
+        'upload': {'concurrency': 2, 'queue': 8},
+    }
+    ADMISSION_WAIT_TIMEOUT = 30  # Seconds a queued request waits for a slot
+    
+    # Dashboard statistics
+    STATS_RECONCILE_INTERVAL = 300  # Seconds between rescans catching changes made outside the admin
+    
+    # File watcher (invalidates caches when content changes outside the admin)
+    WATCH_ENABLED = os.environ.get('WATCH_ENABLED', '1') != '0'
+    WATCH_BACKEND = os.environ.get('WATCH_BACKEND', 'auto')  # 'auto', 'inotify' or 'polling'
+    WATCH_PATHS = (DATA_FOLDER, UPLOAD_FOLDER)
+    WATCH_DEBOUNCE = 0.5  # Seconds of quiet before a batch of changes is delivered
+    WATCH_MAX_DELAY = 3  # Deliver at least this often during a steady stream of changes
+    WATCH_POLL_INTERVAL = 5  # Seconds between scans when inotify is unavailable
+    
+    # Backups (content-addressed snapshots of data and uploads)
+    BACKUP_FOLDER = os.path.join(os.path.dirname(__file__), 'backups')
+    BACKUP_KEEP_LAST = 10  # Always keep this many of the newest snapshots
+    BACKUP_KEEP_DAILY = 7  # Plus the newest snapshot of each of this many days
+    BACKUP_FORMAT = os.environ.get('BACKUP_FORMAT', 'zip')  # 'zip' or 'tar.zst' (needs zstandard)
+    BACKUP_WORKERS = os.cpu_count() or 1  # Threads compressing archive members
+    BACKUP_ZSTD_LEVEL = 6
+    MAX_RESTORE_SIZE = 1024 * 1024 * 1024  # Uploaded backups may exceed MAX_CONTENT_LENGTH
+    
+    # Logging (written off the request thread; rotated files are gzipped)
+    LOG_FOLDER = os.path.join(os.path.dirname(__file__), 'logs')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')  # 'text' or 'json' (one object per line)
+    LOG_ROTATION = os.environ.get('LOG_ROTATION', 'size')  # 'size' or 'time'
+    LOG_MAX_BYTES = 10 * 1024 * 1024  # Size-based rotation threshold
+    LOG_ROTATE_WHEN = 'midnight'  # Time-based rotation interval (TimedRotatingFileHandler 'when')
+    LOG_BACKUP_COUNT = 14  # Rotated files kept
+    LOG_QUEUE_SIZE = 10000  # Records buffered for the writer; further records are dropped
+    
+    # Request metrics (/admin/api/metrics); scrapers may authenticate with this bearer token
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    
+    # Request profiling (cProfile); off unless sampling or a secret is configured
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))  # Fraction of requests profiled
+    PROFILE_SECRET = os.environ.get('PROFILE_SECRET')  # Key for signed X-Profile headers
+    PROFILE_FOLDER = os.path.join(CACHE_FOLDER, 'profiles')
+    PROFILE_KEEP = 50  # Newest profiles kept on disk
+    PROFILE_TOP_N = 25  # Functions listed in each summary
+    
+    # Per-request filesystem and SQL accounting (Server-Timing header, slow-request log)
+    IO_ACCOUNTING = os.environ.get('IO_ACCOUNTING', '0') == '1'
+    SLOW_REQUEST_MS = 500  # Requests slower than this are logged
     
     # Admin credentials (initial setup)
     DEFAULT_ADMIN_EMAIL = 'admin@philanthroforge.com'
@@ -38,3 +140,36 @@ class Config:
     # Unsplash API Configuration
     UNSPLASH_ACCESS_KEY = os.environ.get('UNSPLASH_ACCESS_KEY') or '0uRLpYAEQbLf1qw5DIN1IYy0oRdBX3Uh8ayzoO7Hyfg'
     UNSPLASH_SECRET_KEY = os.environ.get('UNSPLASH_SECRET_KEY') or '3whfR8dCArWtdGDYZKA5IsOEFTnFSMqaj3JE4zY_6hU'
+    UNSPLASH_API_URL = os.environ.get('UNSPLASH_API_URL') or 'https://api.unsplash.com'
+    UNSPLASH_BREAKER_THRESHOLD = 5  # Consecutive failures before falling back to mock results
+    UNSPLASH_BREAKER_RESET = 60  # Seconds before retrying a failing API
+    UNSPLASH_DOWNLOAD_WIDTH = 1920  # Requested width (matches the optimizer's max width)
+    UNSPLASH_MAX_DOWNLOAD_BYTES = 25 * 1024 * 1024  # 25MB
+    DOWNLOAD_CHUNK_SIZE = 64 * 1024
+    UNSPLASH_IMPORT_WORKERS = 6  # Photos downloaded concurrently
+    UNSPLASH_PER_HOST_LIMIT = 4  # Concurrent requests per remote host
+    UNSPLASH_IMPORT_MAX_ITEMS = 30  # Photos per batch import
+    UNSPLASH_MAX_PER_PAGE = 30  # Largest search page size the API accepts
+    UNSPLASH_IMPORT_JOBS_KEPT = 20  # Finished jobs kept for status polling
+    
+    # Proxied Unsplash preview thumbnails
+    THUMB_CACHE_FOLDER = os.path.join(CACHE_FOLDER, 'thumbs')
+    THUMB_CACHE_MAX_BYTES = 100 * 1024 * 1024  # 100MB
+    THUMB_MAX_BYTES = 2 * 1024 * 1024  # Larger responses are not thumbnails
+    THUMB_MAX_AGE = 7 * 24 * 3600  # Browser cache lifetime (seconds)
+    THUMB_PROXY_HOSTS = ('images.unsplash.com', 'plus.unsplash.com', 'placehold.co')
+    
+    # Outbound HTTP (shared keep-alive session)
+    HTTP_CONNECT_TIMEOUT = 3.05  # Seconds
+    HTTP_READ_TIMEOUT = 15  # Seconds
+    HTTP_RETRIES = 3  # Retries on connection errors, 429 and 5xx
+    HTTP_BACKOFF_FACTOR = 0.3  # Exponential backoff base (seconds)
+    HTTP_BACKOFF_JITTER = 0.3  # Random extra delay per retry (seconds)
+    HTTP_POOL_CONNECTIONS = 4  # Hosts kept in the pool
+    HTTP_POOL_MAXSIZE = 10  # Connections kept per host
+    
+    # Unsplash search cache
+    UNSPLASH_CACHE_DATABASE = os.path.join(CACHE_FOLDER, 'unsplash.db')
+    UNSPLASH_CACHE_TTL = 60 * 60  # Fresh for 1 hour
+    UNSPLASH_CACHE_STALE_TTL = 24 * 60 * 60  # Then served stale (while refreshing) for 1 day
+    UNSPLASH_CACHE_SIZE = 256  # In-memory entries
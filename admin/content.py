@@ -4,8 +4,14 @@ Handles page content storage, editing, and publishing
 """
 import json
 import os
+import re
 from datetime import datetime
+from urllib.parse import unquote
 from config import Config
+import stats
+
+IMG_TAG_RE = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+ATTR_RE = re.compile(r'([\w:-]+)\s*=\s*("[^"]*"|\'[^\']*\'|[^\s>]+)')
 
 def get_page_content(page_id):
     """Load page content from JSON file"""
@@ -33,6 +39,7 @@ def save_page_content(page_id, content):
     
     with open(page_file, 'w', encoding='utf-8') as f:
         json.dump(content, f, indent=2, ensure_ascii=False)
+    stats.file_saved(page_file)
     
     # Auto-publish to static HTML
     success, message = publish_page(page_id)
@@ -78,6 +85,12 @@ def publish_page(page_id):
                 else:
                     # All other types (SECTION, INTRO, etc) go to MAIN
                     zones['MAIN'] += block['content'] + "\n"
+    
+    # Add intrinsic sizes, lazy loading and placeholders to <img> tags
+    # (zones render in this order, so the first images are the hero)
+    state = {'seen': 0}
+    for zone_name in ('HEADER', 'MAIN', 'FOOTER'):
+        zones[zone_name] = optimize_img_tags(zones[zone_name], os.path.dirname(file_path), state)
 
     # 4. Read HTML file
     with open(file_path, 'r', encoding='utf-8') as f:
@@ -136,6 +149,91 @@ def publish_page(page_id):
         
     return True, f"Successfully published to {filename}"
 
+def resolve_image_src(src, page_dir):
+    """
+    Map an <img> src to a local image file
+    
+    Args:
+        src: src attribute value (e.g. 'assets/home/hero.jpg', '../assets/x.jpg')
+        page_dir: Directory of the HTML file the tag is published into
+    
+    Returns:
+        Absolute path of the image, or None for remote or missing images
+    """
+    src = unquote(src.split('?', 1)[0].split('#', 1)[0])
+    if not src or re.match(r'^([a-z]+:|//)', src, re.IGNORECASE):
+        return None
+    
+    if src.startswith('/'):
+        full_path = os.path.normpath(os.path.join(Config.BASE_DIR, src.lstrip('/')))
+    else:
+        full_path = os.path.normpath(os.path.join(page_dir, src))
+    
+    if not full_path.startswith(Config.BASE_DIR + os.sep):
+        return None
+    if os.path.isfile(full_path):
+        return full_path
+    
+    # Admin uploads are served under /assets/ as well
+    rel_path = os.path.relpath(full_path, os.path.join(Config.BASE_DIR, 'assets'))
+    if not rel_path.startswith('..'):
+        upload_path = os.path.join(Config.UPLOAD_FOLDER, rel_path)
+        if os.path.isfile(upload_path):
+            return upload_path
+    return None
+
+def optimize_img_tags(html, page_dir, state):
+    """
+    Add width/height, loading, decoding and a blurred placeholder to <img> tags
+    
+    Attributes already set by the editor are left alone. The first
+    Config.EAGER_IMAGES images of the page (tracked in state['seen']) are
+    treated as hero images: loaded eagerly with high fetch priority.
+    """
+    import image_index
+    
+    def rewrite(match):
+        tag = match.group(0)
+        attrs = {name.lower(): value.strip('"\'') for name, value in ATTR_RE.findall(tag)}
+        if 'src' not in attrs:
+            return tag
+        
+        state['seen'] += 1
+        is_hero = state['seen'] <= Config.EAGER_IMAGES
+        
+        additions = {}
+        if 'loading' not in attrs:
+            additions['loading'] = 'eager' if is_hero else 'lazy'
+        if 'decoding' not in attrs:
+            additions['decoding'] = 'sync' if is_hero else 'async'
+        if is_hero and 'fetchpriority' not in attrs:
+            additions['fetchpriority'] = 'high'
+        
+        full_path = resolve_image_src(attrs['src'], page_dir)
+        metadata = image_index.get_image_metadata(full_path) if full_path else None
+        
+        if metadata:
+            if 'width' not in attrs and 'height' not in attrs:
+                additions['width'] = str(metadata['width'])
+                additions['height'] = str(metadata['height'])
+            
+            # Transparent images would show the placeholder through them
+            if not metadata['has_alpha'] and 'style' not in attrs:
+                additions['style'] = (
+                    f"background-image:url({metadata['placeholder']});"
+                    "background-size:cover;background-position:center"
+                )
+        
+        if not additions:
+            return tag
+        
+        extra = ''.join(f' {name}="{value}"' for name, value in additions.items())
+        if tag.endswith('/>'):
+            return tag[:-2].rstrip() + extra + '/>'
+        return tag[:-1].rstrip() + extra + '>'
+    
+    return IMG_TAG_RE.sub(rewrite, html)
+
 def publish_all_pages():
     """
     Regenerate all static HTML files from JSON content
@@ -0,0 +1,125 @@
+"""
+Database Module
+Small bounded pools of SQLite connections with WAL journaling and tuned pragmas
+"""
+import time
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from config import Config
+import io_accounting
+
+_pools = {}  # path -> LifoQueue of idle connections
+_pools_lock = threading.Lock()
+
+# journal_mode=WAL is stored in the database file, so it is set once per path
+PRAGMAS = (
+    'PRAGMA synchronous=NORMAL',  # durable enough under WAL, far fewer fsyncs
+    f'PRAGMA busy_timeout={Config.DATABASE_BUSY_TIMEOUT_MS}',
+    f'PRAGMA cache_size=-{Config.DATABASE_CACHE_KB}',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA foreign_keys=ON'
+)
+
+
+def _get_pool(path):
+    """Idle connections for a database, enabling WAL the first time it is used"""
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            conn = sqlite3.connect(path, timeout=Config.DATABASE_BUSY_TIMEOUT_MS / 1000)
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')  # readers never block on writers
+            finally:
+                conn.close()
+            pool = _pools[path] = queue.LifoQueue(maxsize=Config.DATABASE_POOL_SIZE)
+        return pool
+
+
+def _connect(path):
+    # Pooled connections move between request threads (one user at a time)
+    conn = sqlite3.connect(
+        path,
+        timeout=Config.DATABASE_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=Config.DATABASE_STATEMENT_CACHE,
+        check_same_thread=False
+    )
+    io_accounting.watch_connection(conn)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+@contextmanager
+def connection(path=None):
+    """
+    Borrow a connection to a database from its pool
+
+    Statements are compiled once per connection and reused from sqlite3's
+    statement cache, so keep SQL in module constants rather than formatting it.
+    Connections beyond DATABASE_POOL_SIZE idle ones are closed when returned.
+
+    Args:
+        path: Database file (defaults to Config.DATABASE)
+
+    Yields:
+        sqlite3.Connection
+    """
+    pool = _get_pool(path or Config.DATABASE)
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        conn = _connect(path or Config.DATABASE)
+    try:
+        yield conn
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        try:
+            pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+def query_one(sql, params=(), path=None):
+    """Run a query and return its first row (or None)"""
+    with connection(path) as conn:
+        started = time.perf_counter()
+        try:
+            return conn.execute(sql, params).fetchone()
+        finally:
+            io_accounting.sql_time(time.perf_counter() - started)
+
+
+def execute(sql, params=(), path=None):
+    """Run a single write statement in its own transaction"""
+    with connection(path) as conn:
+        started = time.perf_counter()
+        try:
+            with conn:
+                return conn.execute(sql, params).rowcount
+        finally:
+            io_accounting.sql_time(time.perf_counter() - started)
+
+
+@contextmanager
+def transaction(path=None):
+    """Yield a connection; commit on success, roll back on error"""
+    with connection(path) as conn:
+        with conn:
+            yield conn
+
+
+def close_connections():
+    """Close every idle pooled connection"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        while True:
+            try:
+                pool.get_nowait().close()
+            except queue.Empty:
+                break
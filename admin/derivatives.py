@@ -0,0 +1,116 @@
+"""
+Image Derivatives Module
+Generates resized/re-encoded variants of uploads on demand (/assets/<path>?w=640&fmt=webp&q=auto)
+"""
+import hashlib
+from io import BytesIO
+from PIL import Image, ImageOps
+from config import Config
+from disk_cache import DiskCache
+import images as images_module
+
+# fmt parameter -> (PIL format, extension, mimetype)
+FORMATS = {
+    'webp': ('WEBP', '.webp', 'image/webp'),
+    'jpeg': ('JPEG', '.jpg', 'image/jpeg'),
+    'jpg': ('JPEG', '.jpg', 'image/jpeg'),
+    'png': ('PNG', '.png', 'image/png')
+}
+
+# Source formats that can be transformed
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+cache = DiskCache(Config.DERIVATIVE_CACHE_FOLDER, Config.DERIVATIVE_CACHE_MAX_BYTES)
+
+
+class DerivativeError(ValueError):
+    """Raised for transform parameters outside the allow-list"""
+
+
+def parse_params(args, accept_webp=False, source_ext=''):
+    """
+    Validate transform query parameters
+
+    Args:
+        args: Request query arguments (w, fmt, q)
+        accept_webp: Whether the browser accepts WebP (used by fmt=auto)
+        source_ext: Extension of the source image
+
+    Returns:
+        tuple: (width or None, fmt key, quality)
+    """
+    width = args.get('w')
+    if width is not None:
+        try:
+            width = int(width)
+        except ValueError:
+            raise DerivativeError('Width must be a number')
+        if width not in Config.DERIVATIVE_WIDTHS:
+            allowed = ', '.join(str(w) for w in Config.DERIVATIVE_WIDTHS)
+            raise DerivativeError(f'Width {width} not allowed. Allowed widths: {allowed}')
+
+    fmt = (args.get('fmt') or 'auto').lower()
+    if fmt == 'auto':
+        if accept_webp:
+            fmt = 'webp'
+        else:
+            fmt = 'png' if source_ext.lower() in ('.png', '.gif') else 'jpeg'
+    if fmt not in FORMATS:
+        raise DerivativeError(f'Format {fmt} not allowed')
+
+    quality = (args.get('q') or 'auto').lower()
+    if quality == 'auto':
+        quality = Config.DERIVATIVE_AUTO_QUALITY
+    else:
+        try:
+            quality = int(quality)
+        except ValueError:
+            raise DerivativeError('Quality must be a number or "auto"')
+        if quality not in Config.DERIVATIVE_QUALITIES:
+            allowed = ', '.join(str(q) for q in Config.DERIVATIVE_QUALITIES)
+            raise DerivativeError(f'Quality {quality} not allowed. Allowed qualities: auto, {allowed}')
+
+    return width, fmt, quality
+
+
+def render(full_path, width, fmt, quality):
+    """Resize and encode an image, returns the encoded bytes"""
+    pil_format = FORMATS[fmt][0]
+
+    with Image.open(full_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if width and img.width > width:
+            ratio = width / img.width
+            img = img.resize((width, max(1, round(img.height * ratio))), Image.Resampling.LANCZOS)
+
+        if pil_format == 'JPEG':
+            img = img.convert('RGB')
+        elif img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA')
+
+        buffer = BytesIO()
+        if pil_format == 'PNG':
+            img.save(buffer, 'PNG', optimize=True)
+        elif pil_format == 'WEBP':
+            img.save(buffer, 'WEBP', quality=quality, method=4)
+        else:
+            img.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+        return buffer.getvalue()
+
+
+def get_derivative(full_path, width, fmt, quality):
+    """
+    Open the cached derivative of an image, rendering it on first use
+
+    The cache key is derived from the source contents and the transform,
+    so edits to the source produce a new entry and identical sources share one.
+
+    Returns:
+        tuple: (open file of the cached derivative, mimetype, cache key)
+    """
+    source = images_module.file_digest(full_path)
+    key = hashlib.sha256(f"{source}:{width}:{fmt}:{quality}".encode()).hexdigest()
+    _, ext, mimetype = FORMATS[fmt]
+
+    f = cache.open_or_create(key, ext, lambda: render(full_path, width, fmt, quality))
+    return f, mimetype, key
@@ -0,0 +1,141 @@
+"""
+Disk Cache Module
+Size-capped, content-addressed LRU cache of generated files
+"""
+import os
+import threading
+from collections import OrderedDict
+
+
+class DiskCache:
+    """
+    Stores generated files under folder/<key[:2]>/<key><ext>
+
+    Each key is produced once: concurrent callers asking for a key that is
+    being generated wait for that single producer instead of repeating
+    the work. Least recently used entries are evicted once the total size
+    exceeds max_bytes.
+    """
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (key, ext) -> size, oldest first
+        self._total = 0
+        self._inflight = {}  # (key, ext) -> threading.Event
+        self._loaded = False
+
+    def _load(self):
+        """Index files left on disk by a previous run (oldest first)"""
+        found = []
+        if os.path.isdir(self.folder):
+            for shard in os.scandir(self.folder):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    if entry.name.startswith('.') or not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    key, ext = os.path.splitext(entry.name)
+                    found.append((stat.st_mtime, (key, ext), stat.st_size))
+
+        for _, item, size in sorted(found):
+            self._entries[item] = size
+            self._total += size
+        self._loaded = True
+
+    def path_for(self, key, ext=''):
+        """Location of a cache entry on disk"""
+        return os.path.join(self.folder, key[:2], key + ext)
+
+    def _open(self, item):
+        """Open an indexed entry (lock held), dropping it if the file is gone"""
+        try:
+            f = open(self.path_for(*item), 'rb')
+        except FileNotFoundError:
+            self._total -= self._entries.pop(item)
+            return None
+        self._entries.move_to_end(item)
+        return f
+
+    def open(self, key, ext=''):
+        """Open a cached entry for reading, or return None"""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if (key, ext) in self._entries:
+                return self._open((key, ext))
+        return None
+
+    def open_or_create(self, key, ext, producer, timeout=60):
+        """
+        Open a cache entry for reading, generating it with producer() if needed
+
+        Files are opened while the cache lock is held, so an eviction on
+        another thread can only unlink an entry the caller already has open.
+
+        Args:
+            key: Content-addressed key (hex digest)
+            ext: File extension of the entry (e.g. '.webp')
+            producer: Callable returning the entry's bytes
+            timeout: Seconds to wait for another thread generating the same key
+
+        Returns:
+            file: the entry opened in binary mode (the caller closes it)
+        """
+        item = (key, ext)
+        while True:
+            with self._lock:
+                if not self._loaded:
+                    self._load()
+                if item in self._entries:
+                    f = self._open(item)
+                    if f is not None:
+                        return f
+                event = self._inflight.get(item)
+                if event is None:
+                    event = self._inflight[item] = threading.Event()
+                    break
+
+            # Someone else is generating this entry; wait and re-check
+            # (if they failed we become the producer on the next pass)
+            if not event.wait(timeout):
+                raise TimeoutError(f'Timed out waiting for cache entry {key}')
+
+        try:
+            data = producer()
+            path = self.path_for(key, ext)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+
+            with self._lock:
+                self._entries[item] = len(data)
+                self._total += len(data)
+                f = open(path, 'rb')
+                self._evict()
+            return f
+        finally:
+            with self._lock:
+                self._inflight.pop(item).set()
+
+    def _evict(self):
+        """Drop least recently used entries until under the size cap (lock held)"""
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            (key, ext), size = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(self.path_for(key, ext))
+            except OSError:
+                pass
+
+    def stats(self):
+        """Number of entries and total size in bytes"""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            return {'entries': len(self._entries), 'size': self._total, 'max_size': self.max_bytes}
@@ -5,25 +5,17 @@ Provides centralized error handling, logging, and custom error pages
 for the PhilanthroForge Admin Panel.
 """
 
-import os
 import logging
-from datetime import datetime
 from functools import wraps
 from flask import render_template, flash, redirect, url_for, request
 from werkzeug.exceptions import HTTPException
 
-# Configure logging
-LOG_FOLDER = os.path.join(os.path.dirname(__file__), 'logs')
-os.makedirs(LOG_FOLDER, exist_ok=True)
+from config import Config
+from log_handlers import configure_logging
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(os.path.join(LOG_FOLDER, 'admin.log')),
-        logging.StreamHandler()
-    ]
-)
+# Configure logging (records are written by a background listener)
+LOG_FOLDER = Config.LOG_FOLDER
+log_listener = configure_logging(logging.INFO)
 
 logger = logging.getLogger(__name__)
 
@@ -41,12 +33,25 @@ def log_info(message):
     logger.info(message)
 
 
+def log_warning(message):
+    """Log a warning message"""
+    logger.warning(message)
+
+
 def log_auth_attempt(email, success):
     """Log authentication attempts"""
     status = "SUCCESS" if success else "FAILED"
     logger.info(f"Auth attempt: {email} - {status} - IP: {request.remote_addr}")
 
 
+def log_slow_request(method, path, status, duration_ms, details=None):
+    """Log a request that took longer than SLOW_REQUEST_MS"""
+    message = f"Slow request: {method} {path} -> {status} in {duration_ms:.0f}ms"
+    if details:
+        message += f" | {details}"
+    logger.warning(message)
+
+
 def log_content_change(user_id, action, content_type, content_id):
     """Log content changes for audit trail"""
     logger.info(f"User {user_id} {action} {content_type}: {content_id}")
@@ -0,0 +1,131 @@
+"""
+Fake Unsplash API server for offline testing
+
+Serves /search/photos, /photos/<id>/download and generated JPEGs under
+/images/<id>.jpg, with optional failure injection.
+
+Usage:
+    python3 fake_unsplash.py --port 8765 [--fail-first 3] [--status 503] [--delay 0.5]
+    UNSPLASH_API_URL=http://127.0.0.1:8765 python3 app.py
+
+Or from Python:
+    server, base_url = start_fake_server()
+    ...
+    server.shutdown()
+"""
+import json
+import time
+import argparse
+import threading
+from io import BytesIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from PIL import Image
+
+
+class FakeUnsplashHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body, content_type='application/json'):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _base_url(self):
+        return f"http://{self.headers.get('Host')}"
+
+    def _photo(self, photo_id, query):
+        base = self._base_url()
+        return {
+            'id': photo_id,
+            'description': None,
+            'alt_description': f'{query} photo {photo_id}',
+            'urls': {
+                'thumb': f'{base}/images/{photo_id}.jpg?w=200',
+                'regular': f'{base}/images/{photo_id}.jpg?w=1080'
+            },
+            'links': {'download_location': f'{base}/photos/{photo_id}/download'},
+            'user': {'name': 'Fake Photographer', 'links': {'html': f'{base}/@fake'}}
+        }
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            should_fail = server.requests <= server.fail_first
+
+        if server.delay:
+            time.sleep(server.delay)
+        if should_fail:
+            self._send(server.fail_status, {'errors': ['Injected failure']})
+            return
+
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+
+        if url.path == '/search/photos':
+            query = params.get('query', [''])[0]
+            page = int(params.get('page', ['1'])[0])
+            per_page = int(params.get('per_page', ['12'])[0])
+            results = [self._photo(f'{query}-{page}-{i}', query) for i in range(per_page)]
+            self._send(200, {'total': per_page * 5, 'total_pages': 5, 'results': results})
+
+        elif url.path.startswith('/photos/') and url.path.endswith('/download'):
+            photo_id = url.path.split('/')[2]
+            self._send(200, {'url': f'{self._base_url()}/images/{photo_id}.jpg?w=1920'})
+
+        elif url.path.startswith('/images/'):
+            width = int(params.get('w', ['800'])[0])
+            seed = sum(url.path.encode()) % 255
+            img = Image.new('RGB', (width, width * 2 // 3), (seed, 120, 255 - seed))
+            buffer = BytesIO()
+            img.save(buffer, 'JPEG', quality=90)
+            self._send(200, buffer.getvalue(), 'image/jpeg')
+
+        else:
+            self._send(404, {'errors': ['Not found']})
+
+
+def start_fake_server(port=0, fail_first=0, fail_status=503, delay=0, verbose=False):
+    """
+    Start the fake API in a background thread
+
+    Returns:
+        tuple: (server, base_url); call server.shutdown() when done
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), FakeUnsplashHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.fail_first = fail_first
+    server.fail_status = fail_status
+    server.delay = delay
+    server.verbose = verbose
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fake Unsplash API for offline testing')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fail-first', type=int, default=0, help='Fail this many requests first')
+    parser.add_argument('--status', type=int, default=503, help='Status code of injected failures')
+    parser.add_argument('--delay', type=float, default=0, help='Seconds to wait before each response')
+    args = parser.parse_args()
+
+    server, base_url = start_fake_server(args.port, args.fail_first, args.status, args.delay, verbose=True)
+    print(f"Fake Unsplash API running at {base_url}")
+    print(f"Start the admin with: UNSPLASH_API_URL={base_url} python3 app.py")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,179 @@
+"""
+HTTP Client Module
+Shared pooled session with timeouts, jittered retries, circuit breaking and latency metrics
+"""
+import time
+import threading
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import Config
+
+_session = None
+_session_lock = threading.Lock()
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of calling a service whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing service for a while
+
+    After failure_threshold consecutive failures the circuit opens and
+    calls fail fast. Once reset_timeout has passed a single trial call is
+    let through (half-open); success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=60):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        """Whether a call may be attempted now"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+def get_session():
+    """The process-wide keep-alive session (created on first use)"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=Config.HTTP_RETRIES,
+                backoff_factor=Config.HTTP_BACKOFF_FACTOR,
+                backoff_jitter=Config.HTTP_BACKOFF_JITTER,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset({'GET', 'HEAD'}),
+                respect_retry_after_header=True,
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(
+                pool_connections=Config.HTTP_POOL_CONNECTIONS,
+                pool_maxsize=Config.HTTP_POOL_MAXSIZE,
+                max_retries=retry
+            )
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+def _record(metric, elapsed, status=None, error=False):
+    """Record a call's latency (ms) and outcome under a metric name"""
+    with _metrics_lock:
+        entry = _metrics.get(metric)
+        if entry is None:
+            entry = _metrics[metric] = {
+                'count': 0,
+                'errors': 0,
+                'statuses': {},
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'recent_ms': deque(maxlen=200)
+            }
+        entry['count'] += 1
+        entry['total_ms'] += elapsed
+        entry['max_ms'] = max(entry['max_ms'], elapsed)
+        entry['recent_ms'].append(elapsed)
+        if error:
+            entry['errors'] += 1
+        if status is not None:
+            entry['statuses'][status] = entry['statuses'].get(status, 0) + 1
+
+
+def get_metrics():
+    """Latency summary per metric name"""
+    summary = {}
+    with _metrics_lock:
+        for metric, entry in _metrics.items():
+            recent = sorted(entry['recent_ms'])
+            summary[metric] = {
+                'count': entry['count'],
+                'errors': entry['errors'],
+                'statuses': dict(entry['statuses']),
+                'avg_ms': round(entry['total_ms'] / entry['count'], 2) if entry['count'] else 0,
+                'max_ms': round(entry['max_ms'], 2),
+                'p50_ms': round(recent[len(recent) // 2], 2) if recent else 0,
+                'p95_ms': round(recent[int(len(recent) * 0.95)], 2) if recent else 0
+            }
+    return summary
+
+
+def get(url, metric='http', breaker=None, **kwargs):
+    """
+    GET a URL through the shared session
+
+    Args:
+        url: URL to fetch
+        metric: Name the call's latency is recorded under
+        breaker: Optional CircuitBreaker guarding the remote service
+        **kwargs: Passed to requests (headers, params, stream, ...)
+
+    Returns:
+        requests.Response (5xx/429 responses are returned after retries)
+
+    Raises:
+        CircuitOpenError: if the breaker is open
+        requests.RequestException: on connection errors and timeouts
+    """
+    if breaker and not breaker.allow():
+        raise CircuitOpenError(f'{breaker.name} circuit is open')
+
+    kwargs.setdefault('timeout', (Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT))
+    started = time.perf_counter()
+    try:
+        response = get_session().get(url, **kwargs)
+    except requests.RequestException:
+        _record(metric, (time.perf_counter() - started) * 1000, error=True)
+        if breaker:
+            breaker.record_failure()
+        raise
+
+    failed = response.status_code >= 500 or response.status_code == 429
+    _record(metric, (time.perf_counter() - started) * 1000, status=response.status_code, error=failed)
+    if breaker:
+        if failed:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+    return response
@@ -0,0 +1,248 @@
+"""
+Image Index Module
+Persistent metadata (dimensions, format, placeholder) for uploaded and published images,
+computed once per source content hash
+"""
+import os
+import json
+import base64
+import threading
+from io import BytesIO
+from PIL import Image, ImageFilter, ImageOps
+from config import Config
+import images as images_module
+import watcher
+
+INDEXED_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+_lock = threading.RLock()
+_index = None
+_version = 0
+
+_save_lock = threading.Lock()
+_saved_version = 0
+
+
+def _load():
+    """Load the index from disk (lock held)"""
+    global _index
+    if _index is None:
+        try:
+            with open(Config.IMAGE_INDEX_FILE, 'r') as f:
+                _index = json.load(f)
+        except (OSError, ValueError):
+            _index = {}
+        _index.setdefault('paths', {})
+        _index.setdefault('sources', {})
+    return _index
+
+
+def _save():
+    """
+    Write the index atomically (lock not held)
+
+    The index is serialized under the lock and written outside it; a save
+    overtaken by a newer one is skipped so an older snapshot never wins.
+    """
+    global _version, _saved_version
+    with _lock:
+        _version += 1
+        version = _version
+        data = json.dumps(_index)
+
+    with _save_lock:
+        if version <= _saved_version:
+            return
+        os.makedirs(os.path.dirname(Config.IMAGE_INDEX_FILE), exist_ok=True)
+        temp_path = f"{Config.IMAGE_INDEX_FILE}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write(data)
+        os.replace(temp_path, Config.IMAGE_INDEX_FILE)
+        _saved_version = version
+
+
+def _relative(full_path):
+    return os.path.relpath(full_path, Config.BASE_DIR)
+
+
+def make_placeholder(img):
+    """Tiny blurred WebP of an image as a data URI (a few hundred bytes)"""
+    thumb = img.convert('RGB')
+    thumb.thumbnail((Config.PLACEHOLDER_SIZE, Config.PLACEHOLDER_SIZE))
+    thumb = thumb.filter(ImageFilter.GaussianBlur(1))
+
+    buffer = BytesIO()
+    thumb.save(buffer, 'WEBP', quality=30)
+    return 'data:image/webp;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def _analyze(full_path):
+    """Compute metadata for an image file"""
+    with Image.open(full_path) as img:
+        img = ImageOps.exif_transpose(img)
+        return {
+            'width': img.width,
+            'height': img.height,
+            'format': img.format,
+            'has_alpha': img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info,
+            'animated': getattr(img, 'is_animated', False),
+            'placeholder': make_placeholder(img)
+        }
+
+
+def _source_hash(full_path, stats):
+    """Content hash of a file, reusing the stored one when the file is unchanged"""
+    with _lock:
+        entry = _load()['paths'].get(_relative(full_path))
+    if entry and entry['mtime'] == stats.st_mtime_ns and entry['size'] == stats.st_size:
+        return entry['hash']
+    return images_module.file_digest(full_path)
+
+
+def get_image_metadata(full_path):
+    """
+    Get metadata for an image, computing it on first sight of its contents
+
+    Args:
+        full_path: Absolute path to the image
+
+    Returns:
+        dict with width, height, format, has_alpha, animated and placeholder,
+        or None if the file is not a readable image
+    """
+    if not full_path.lower().endswith(INDEXED_EXTENSIONS) or not os.path.isfile(full_path):
+        return None
+
+    # Hashing and decoding run outside the lock; only the index update holds it
+    stats = os.stat(full_path)
+    digest = _source_hash(full_path, stats)
+    rel_path = _relative(full_path)
+
+    with _lock:
+        metadata = _load()['sources'].get(digest)
+    if metadata is None:
+        try:
+            metadata = _analyze(full_path)
+        except Exception as e:
+            print(f"Error indexing image {rel_path}: {e}")
+            return None
+
+    path_entry = {'mtime': stats.st_mtime_ns, 'size': stats.st_size, 'hash': digest}
+    with _lock:
+        index = _load()
+        changed = digest not in index['sources'] or index['paths'].get(rel_path) != path_entry
+        metadata = index['sources'].setdefault(digest, metadata)
+        index['paths'][rel_path] = path_entry
+
+    if changed:
+        _save()
+    return metadata
+
+
+def index_image(full_path):
+    """Index a newly written image (upload, replacement, download)"""
+    return get_image_metadata(full_path)
+
+
+def remove_image(full_path):
+    """Forget a deleted image, pruning metadata no other path uses"""
+    with _lock:
+        index = _load()
+        entry = index['paths'].pop(_relative(full_path), None)
+        if entry is None:
+            return
+        if not any(e['hash'] == entry['hash'] for e in index['paths'].values()):
+            index['sources'].pop(entry['hash'], None)
+    _save()
+
+
+def move_image(old_full_path, new_full_path):
+    """Carry a renamed image's entry (and its stored analysis) over to the new path"""
+    with _lock:
+        entry = _load()['paths'].pop(_relative(old_full_path), None)
+        if entry is not None:
+            _index['paths'][_relative(new_full_path)] = entry
+    if entry is None:
+        return index_image(new_full_path)
+    _save()
+    # Refreshes the entry if the file changed; otherwise the stored hash is reused
+    return get_image_metadata(new_full_path)
+
+
+def _on_files_changed(paths):
+    """Drop deleted images and re-index changed ones reported by the watcher"""
+    if paths is None:
+        with _lock:
+            index = _load()
+            paths = [os.path.join(Config.BASE_DIR, rel) for rel in index['paths']]
+    for path in paths:
+        if not path.lower().endswith(INDEXED_EXTENSIONS):
+            continue
+        if os.path.exists(path):
+            get_image_metadata(path)
+        else:
+            remove_image(path)
+
+
+watcher.subscribe(_on_files_changed)
+
+
+def store_analysis(results):
+    """
+    Attach library analysis statistics to indexed images
+
+    Args:
+        results: dict of absolute path -> statistics dict
+    """
+    with _lock:
+        index = _load()
+        for full_path, stats in results.items():
+            entry = index['paths'].get(_relative(full_path))
+            if entry and entry['hash'] in index['sources']:
+                index['sources'][entry['hash']]['analysis'] = stats
+    _save()
+
+
+def search_images(brightness=None, aspect=None, sort=None):
+    """
+    Filter uploaded images by their stored analysis, without opening any file
+
+    Args:
+        brightness: 'dark', 'medium' or 'light'
+        aspect: 'landscape', 'portrait' or 'square'
+        sort: 'brightness', 'sharpness' or 'name'
+
+    Returns:
+        list of dicts with path, src, dimensions and analysis
+    """
+    uploads = _relative(Config.UPLOAD_FOLDER) + os.sep
+    results = []
+
+    with _lock:
+        index = _load()
+        for rel_path, entry in index['paths'].items():
+            if not rel_path.startswith(uploads):
+                continue
+            metadata = index['sources'].get(entry['hash'])
+            analysis = metadata.get('analysis') if metadata else None
+            if not analysis:
+                continue
+            if brightness and analysis['brightness_class'] != brightness:
+                continue
+            if aspect and analysis['aspect'] != aspect:
+                continue
+
+            results.append({
+                'name': os.path.basename(rel_path),
+                'path': rel_path,
+                'src': 'assets/' + rel_path[len(uploads):].replace(os.sep, '/'),
+                'width': metadata['width'],
+                'height': metadata['height'],
+                'analysis': analysis
+            })
+
+    if sort in ('brightness', 'sharpness'):
+        results.sort(key=lambda r: r['analysis'][sort], reverse=(sort == 'sharpness'))
+    else:
+        results.sort(key=lambda r: r['name'].lower())
+    return results
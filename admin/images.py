@@ -3,11 +3,23 @@ Image Management Module
 Handles image uploads, optimization, and file operations
 """
 import os
-from PIL import Image
+import math
+import hashlib
+import threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageChops, ImageSequence, ImageStat
 from werkzeug.utils import secure_filename
 from config import Config
+import svg_optimizer
+import stats as stats_module
+import watcher
 import shutil
 
+# path -> (mtime, size, sha256 of the file contents)
+_digests = {}
+_digests_lock = threading.Lock()
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and \
@@ -49,6 +61,290 @@ def optimize_image(image_path, max_width=1920, quality=85):
         print(f"Error optimizing image: {e}")
         return False
 
+# ============================================================================
+# Best-format selection (PNG and GIF uploads)
+# ============================================================================
+
+# Output format -> file extension for each candidate encoding
+FORMAT_EXTENSIONS = {
+    'PNG': '.png',
+    'WEBP': '.webp',
+    'JPEG': '.jpg',
+    'GIF': '.gif'
+}
+
+def _has_alpha(img):
+    """Check if an image has any pixel that is not fully opaque"""
+    if img.mode in ('RGBA', 'LA', 'PA'):
+        return img.getchannel('A').getextrema() != (255, 255)
+    if 'transparency' in img.info:
+        return img.convert('RGBA').getchannel('A').getextrema() != (255, 255)
+    return False
+
+def _psnr(original, candidate):
+    """
+    Peak signal-to-noise ratio (dB) between two images of the same size,
+    on premultiplied pixels: colour under full transparency is not compared
+    """
+    diff = ImageChops.difference(original.convert('RGBA').convert('RGBa'),
+                                 candidate.convert('RGBA').convert('RGBa'))
+    stat = ImageStat.Stat(diff)
+    mse = sum(stat.sum2) / (len(stat.sum2) * original.width * original.height)
+    if mse == 0:
+        return float('inf')
+    return 10 * math.log10(255 ** 2 / mse)
+
+def _encode_png(img, quality):
+    buffer = BytesIO()
+    img.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+def _encode_palette_png(img, quality):
+    method = Image.Quantize.FASTOCTREE if img.mode == 'RGBA' else Image.Quantize.MEDIANCUT
+    buffer = BytesIO()
+    img.quantize(colors=256, method=method).save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+def _encode_webp_lossless(img, quality):
+    buffer = BytesIO()
+    # exact keeps the RGB values under fully transparent pixels, so the
+    # output decodes to the very same pixels
+    img.save(buffer, 'WEBP', lossless=True, exact=True, quality=100, method=4)
+    return buffer.getvalue()
+
+def _encode_webp_lossy(img, quality):
+    buffer = BytesIO()
+    img.save(buffer, 'WEBP', quality=quality, method=4)
+    return buffer.getvalue()
+
+def _encode_jpeg(img, quality):
+    buffer = BytesIO()
+    img.convert('RGB').save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+# name -> (output format, encoder, lossy, needs opaque source)
+ENCODERS = {
+    'png': ('PNG', _encode_png, False, False),
+    'png-palette': ('PNG', _encode_palette_png, True, False),
+    'webp-lossless': ('WEBP', _encode_webp_lossless, False, False),
+    'webp-lossy': ('WEBP', _encode_webp_lossy, True, False),
+    'jpeg': ('JPEG', _encode_jpeg, True, True)
+}
+
+def choose_best_encoding(img, formats=None, quality=85, threshold=None):
+    """
+    Encode an image with every candidate encoder in parallel and keep the
+    smallest result whose quality stays above the PSNR threshold
+    
+    Args:
+        img: PIL Image (RGB or RGBA)
+        formats: Optional set of allowed output formats (e.g. {'PNG'})
+        quality: Quality used by the lossy encoders (1-100)
+        threshold: Minimum PSNR in dB for lossy candidates
+    
+    Returns:
+        dict with encoding name, format, extension, data and candidate sizes,
+        or None if no candidate is allowed
+    """
+    if threshold is None:
+        threshold = Config.IMAGE_QUALITY_THRESHOLD
+    
+    alpha = _has_alpha(img)
+    candidates = {
+        name: spec for name, spec in ENCODERS.items()
+        if (formats is None or spec[0] in formats) and not (spec[3] and alpha)
+    }
+    if not candidates:
+        return None
+    
+    # Image.save mutates the image (encoderinfo, load()), so every encoder
+    # gets its own copy; the reference is only read
+    reference = img.convert('RGBA')
+    sources = {name: img.copy() for name in candidates}
+    
+    def run(name):
+        fmt, encoder, lossy, _ = candidates[name]
+        data = encoder(sources[name], quality)
+        # Lossless candidates are checked too: they must decode to the source exactly
+        with Image.open(BytesIO(data)) as decoded:
+            score = _psnr(reference, decoded)
+        if not lossy and not math.isinf(score):
+            from error_handler import log_warning
+            log_warning(f"Lossless encoder {name} did not round-trip (PSNR {score:.1f} dB)")
+            score = float('-inf')
+        return name, data, score
+    
+    with ThreadPoolExecutor(max_workers=min(len(candidates), Config.IMAGE_ENCODER_WORKERS)) as executor:
+        results = list(executor.map(run, candidates))
+    
+    acceptable = [r for r in results if r[2] >= threshold]
+    name, data, score = min(acceptable or results, key=lambda r: len(r[1]))
+    fmt = candidates[name][0]
+    
+    return {
+        'encoding': name,
+        'format': fmt,
+        'ext': FORMAT_EXTENSIONS[fmt],
+        'data': data,
+        'psnr': None if math.isinf(score) else round(score, 2),
+        'candidates': {r[0]: len(r[1]) for r in results}
+    }
+
+def _encode_animated_webp(img, quality):
+    """Re-encode an animated image (GIF) as animated WebP"""
+    frames = []
+    durations = []
+    for frame in ImageSequence.Iterator(img):
+        durations.append(frame.info.get('duration', img.info.get('duration', 100)))
+        frames.append(frame.convert('RGBA'))
+    
+    buffer = BytesIO()
+    frames[0].save(
+        buffer, 'WEBP', save_all=True, append_images=frames[1:],
+        duration=durations, loop=img.info.get('loop', 0),
+        quality=quality, method=4
+    )
+    return buffer.getvalue()
+
+def optimize_to_best_format(image_path, target_ext=None, max_width=1920, quality=85):
+    """
+    Re-encode a PNG or GIF with the smallest acceptable encoding
+    
+    Args:
+        image_path: Path to the image file
+        target_ext: Keep this extension (e.g. '.png') instead of switching
+            format; the file is rewritten in place
+        max_width: Maximum width in pixels
+        quality: Quality used by the lossy encoders (1-100)
+    
+    Returns:
+        dict with success status, final path, chosen encoding and savings
+    """
+    try:
+        original_size = os.path.getsize(image_path)
+        formats = None
+        if target_ext:
+            formats = {fmt for fmt, ext in FORMAT_EXTENSIONS.items()
+                       if ext == target_ext.lower().replace('.jpeg', '.jpg')}
+        
+        with Image.open(image_path) as img:
+            if getattr(img, 'is_animated', False):
+                if formats is not None and 'WEBP' not in formats:
+                    return {'success': False, 'error': 'Animated image must keep its format'}
+                best = {
+                    'encoding': 'webp-animated',
+                    'format': 'WEBP',
+                    'ext': '.webp',
+                    'data': _encode_animated_webp(img, quality),
+                    'psnr': None,
+                    'candidates': {}
+                }
+            else:
+                img.load()
+                source = img.convert('RGBA' if _has_alpha(img) else 'RGB')
+                if source.width > max_width:
+                    ratio = max_width / source.width
+                    source = source.resize((max_width, int(source.height * ratio)), Image.Resampling.LANCZOS)
+                best = choose_best_encoding(source, formats=formats, quality=quality)
+        
+        if not best:
+            return {'success': False, 'error': 'No encoder available for this format'}
+        
+        # Never make a file bigger
+        if len(best['data']) >= original_size:
+            return {
+                'success': True,
+                'path': image_path,
+                'encoding': 'original',
+                'format': None,
+                'original_size': original_size,
+                'size': original_size,
+                'saved_bytes': 0,
+                'candidates': best['candidates']
+            }
+        
+        if target_ext:
+            output_path = image_path
+        else:
+            root, ext = os.path.splitext(image_path)
+            output_path = image_path
+            if ext.lower() != best['ext']:
+                output_path = unique_path(os.path.dirname(image_path), os.path.basename(root) + best['ext'])
+        
+        with open(output_path, 'wb') as f:
+            f.write(best['data'])
+        if output_path != image_path:
+            os.remove(image_path)
+        
+        return {
+            'success': True,
+            'path': output_path,
+            'encoding': best['encoding'],
+            'format': best['format'],
+            'psnr': best['psnr'],
+            'original_size': original_size,
+            'size': len(best['data']),
+            'saved_bytes': original_size - len(best['data']),
+            'candidates': best['candidates']
+        }
+    except Exception as e:
+        print(f"Error choosing image format: {e}")
+        return {'success': False, 'error': str(e)}
+
+def unique_path(target_dir, filename):
+    """Return a path in target_dir that does not clash with an existing file"""
+    filepath = os.path.join(target_dir, filename)
+    name, ext = os.path.splitext(filename)
+    counter = 1
+    while os.path.exists(filepath):
+        filepath = os.path.join(target_dir, f"{name}_{counter}{ext}")
+        counter += 1
+    return filepath
+
+def process_saved_image(filepath):
+    """
+    Run a newly saved image through the upload pipeline: optimization
+    (PNG and GIF may switch to a smaller format) and metadata indexing
+    
+    Args:
+        filepath: Absolute path of the saved file
+    
+    Returns:
+        dict with success status, final filename/path and sizes
+    """
+    # Get file size (before optimization)
+    original_size = os.path.getsize(filepath)
+    
+    # Optimize if it's an image; PNG and GIF may switch to a smaller format
+    encoding = None
+    if filepath.lower().endswith(('.png', '.gif')):
+        encoding = optimize_to_best_format(filepath)
+        if encoding['success']:
+            filepath = encoding['path']
+    elif filepath.lower().endswith(('.jpg', '.jpeg', '.webp')):
+        optimize_image(filepath)
+    elif filepath.lower().endswith('.svg'):
+        svg_optimizer.optimize_svg(filepath)
+    
+    # Get optimized size
+    optimized_size = os.path.getsize(filepath)
+    
+    # Record dimensions and placeholder for publishing
+    import image_index
+    image_index.index_image(filepath)
+    stats_module.file_saved(filepath)
+    
+    return {
+        'success': True,
+        'filename': os.path.basename(filepath),
+        'path': os.path.relpath(filepath, Config.BASE_DIR),
+        'size': optimized_size,
+        'original_size': original_size,
+        'saved_bytes': original_size - optimized_size,
+        'encoding': encoding.get('encoding') if encoding else None,
+        'candidates': encoding.get('candidates') if encoding else None
+    }
+
 def save_uploaded_file(file, folder=''):
     """
     Save uploaded file to assets directory
@@ -73,49 +369,25 @@ def save_uploaded_file(file, folder=''):
     target_dir = os.path.join(Config.UPLOAD_FOLDER, folder) if folder else Config.UPLOAD_FOLDER
     os.makedirs(target_dir, exist_ok=True)
     
-    # Full path
-    filepath = os.path.join(target_dir, filename)
-    
-    # Check if file exists
-    if os.path.exists(filepath):
-        # Add number to filename
-        name, ext = os.path.splitext(filename)
-        counter = 1
-        while os.path.exists(filepath):
-            filename = f"{name}_{counter}{ext}"
-            filepath = os.path.join(target_dir, filename)
-            counter += 1
+    # Full path (add number to filename if it already exists)
+    filepath = unique_path(target_dir, filename)
+    filename = os.path.basename(filepath)
     
     try:
         # Save file
         file.save(filepath)
         
-        # Get file size (before optimization)
-        original_size = os.path.getsize(filepath)
-        
-        # Optimize if it's an image
-        if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')):
-            optimize_image(filepath)
-        
-        # Get optimized size
-        optimized_size = os.path.getsize(filepath)
-        
-        # Get relative path
-        rel_path = os.path.relpath(filepath, Config.BASE_DIR)
-        
-        return {
-            'success': True,
-            'filename': filename,
-            'path': rel_path,
-            'folder': folder,
-            'size': optimized_size,
-            'original_size': original_size,
-            'saved_bytes': original_size - optimized_size
-        }
+        result = process_saved_image(filepath)
+        result['folder'] = folder
+        return result
     
     except Exception as e:
         return {'success': False, 'error': f'Failed to save file: {str(e)}'}
 
+def precompressed_path(full_path):
+    """Path of the gzip variant written next to an SVG (.svg -> .svgz)"""
+    return full_path + 'z'
+
 def delete_image(filepath):
     """
     Delete an image file
@@ -137,6 +409,15 @@ def delete_image(filepath):
             return {'success': False, 'error': 'Invalid file path'}
         
         os.remove(full_path)
+        
+        import image_index
+        image_index.remove_image(full_path)
+        stats_module.file_deleted(full_path)
+        
+        # Remove the precompressed variant too
+        if os.path.exists(precompressed_path(full_path)):
+            os.remove(precompressed_path(full_path))
+        
         return {'success': True, 'message': 'File deleted successfully'}
     
     except Exception as e:
@@ -177,6 +458,19 @@ def rename_image(old_path, new_name):
         # Rename
         os.rename(old_full_path, new_full_path)
         
+        import image_index
+        image_index.move_image(old_full_path, new_full_path)
+        stats_module.file_deleted(old_full_path)
+        stats_module.file_saved(new_full_path)
+        
+        # Move (or drop) the precompressed variant along with it
+        old_variant = precompressed_path(old_full_path)
+        if os.path.exists(old_variant):
+            if new_full_path.lower().endswith('.svg'):
+                os.rename(old_variant, precompressed_path(new_full_path))
+            else:
+                os.remove(old_variant)
+        
         # Get new relative path
         new_rel_path = os.path.relpath(new_full_path, Config.BASE_DIR)
         
@@ -220,8 +514,10 @@ def replace_image(file, existing_path):
         # Get original filename from existing path
         original_filename = os.path.basename(existing_path)
         
-        # Create a temporary path for the new file
-        temp_path = existing_full_path + '.tmp'
+        # Create a temporary path for the new file (keeps the extension so
+        # the optimizer knows which format to write)
+        root, ext = os.path.splitext(existing_full_path)
+        temp_path = f"{root}.tmp{ext}"
         
         # Save new file to temporary location
         file.save(temp_path)
@@ -230,9 +526,13 @@ def replace_image(file, existing_path):
         original_size = os.path.getsize(existing_full_path)
         new_size = os.path.getsize(temp_path)
         
-        # Optimize the new image
-        if temp_path.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')):
+        # Optimize the new image (the filename must not change)
+        if temp_path.lower().endswith('.png'):
+            optimize_to_best_format(temp_path, target_ext=ext)
+        elif temp_path.lower().endswith(('.jpg', '.jpeg', '.webp')):
             optimize_image(temp_path)
+        elif temp_path.lower().endswith('.svg'):
+            svg_optimizer.optimize_svg(temp_path, precompress=False)
         optimized_size = os.path.getsize(temp_path)
         
         # Remove the old file
@@ -241,6 +541,14 @@ def replace_image(file, existing_path):
         # Rename temp file to original name
         os.rename(temp_path, existing_full_path)
         
+        # Refresh the precompressed variant
+        if existing_full_path.lower().endswith('.svg'):
+            svg_optimizer.write_precompressed(existing_full_path)
+        
+        import image_index
+        image_index.index_image(existing_full_path)
+        stats_module.file_saved(existing_full_path)
+        
         return {
             'success': True,
             'message': f'Image replaced successfully',
@@ -299,6 +607,39 @@ def get_image_info(filepath):
     except Exception as e:
         return None
 
+def _forget_digests(paths):
+    """Drop memoized hashes of files the watcher saw change"""
+    with _digests_lock:
+        if paths is None:
+            _digests.clear()
+        else:
+            for path in paths:
+                _digests.pop(path, None)
+
+watcher.subscribe(_forget_digests)
+
+def file_digest(full_path):
+    """
+    SHA-256 of a file's contents, memoized on (path, mtime, size) so
+    unchanged files are only read once
+    """
+    stats = os.stat(full_path)
+    
+    with _digests_lock:
+        memo = _digests.get(full_path)
+    if memo and memo[:2] == (stats.st_mtime_ns, stats.st_size):
+        return memo[2]
+    
+    sha = hashlib.sha256()
+    with open(full_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+    
+    with _digests_lock:
+        _digests[full_path] = (stats.st_mtime_ns, stats.st_size, digest)
+    return digest
+
 def format_file_size(size_bytes):
     """Format file size in human-readable format"""
     for unit in ['B', 'KB', 'MB', 'GB']:
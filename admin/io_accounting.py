@@ -0,0 +1,199 @@
+"""
+I/O Accounting Module
+Counts and times the filesystem and SQLite work each request does (file
+opens, stats, directory scans, bytes read and written, SQL statements) for
+the Server-Timing header and the slow-request log
+"""
+import os
+import time
+import builtins
+import contextvars
+
+_counters = contextvars.ContextVar('io_counters', default=None)
+_installed = False
+
+_real_open = builtins.open
+_real_stat = os.stat
+_real_lstat = os.lstat
+_real_listdir = os.listdir
+_real_scandir = os.scandir
+
+# Server-Timing metric, counter names (count, seconds)
+TIMING_METRICS = (
+    ('fs-open', 'open', 'open_s'),
+    ('fs-stat', 'stat', 'stat_s'),
+    ('fs-scan', 'scan', 'scan_s'),
+    ('db', 'sql', 'sql_s'),
+)
+
+
+def _new_counters():
+    return {
+        'open': 0, 'open_s': 0.0,
+        'stat': 0, 'stat_s': 0.0,
+        'scan': 0, 'scan_s': 0.0,
+        'read_bytes': 0, 'written_bytes': 0,
+        'sql': 0, 'sql_s': 0.0, 'db_connect': 0
+    }
+
+
+def start():
+    """Begin accounting for the current request; returns a token for stop()"""
+    return _counters.set(_new_counters())
+
+
+def stop(token):
+    """End accounting and return the request's counters"""
+    counters = _counters.get()
+    _counters.reset(token)
+    return counters
+
+
+def current():
+    """The current request's counters, or None outside an accounted request"""
+    return _counters.get()
+
+
+def _sql_statement(statement):
+    """sqlite3 trace callback: one statement executed"""
+    counters = _counters.get()
+    if counters is not None:
+        counters['sql'] += 1
+
+
+def watch_connection(conn):
+    """Count a newly opened SQLite connection and the statements it runs"""
+    if not _installed:
+        return
+    conn.set_trace_callback(_sql_statement)
+    counters = _counters.get()
+    if counters is not None:
+        counters['db_connect'] += 1
+
+
+def sql_time(seconds):
+    """Add time spent in a query to the current request (no-op outside one)"""
+    counters = _counters.get()
+    if counters is not None:
+        counters['sql_s'] += seconds
+
+
+class _CountingFile:
+    """Proxy for a file object that counts bytes read and written"""
+
+    def __init__(self, f, counters):
+        self._f = f
+        self._counters = counters
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def __enter__(self):
+        self._f.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._f.__exit__(*exc)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = next(self._f)
+        self._counters['read_bytes'] += len(line)
+        return line
+
+    def read(self, *args):
+        data = self._f.read(*args)
+        self._counters['read_bytes'] += len(data)
+        return data
+
+    def readline(self, *args):
+        data = self._f.readline(*args)
+        self._counters['read_bytes'] += len(data)
+        return data
+
+    def readinto(self, buffer):
+        n = self._f.readinto(buffer)
+        self._counters['read_bytes'] += n or 0
+        return n
+
+    def write(self, data):
+        n = self._f.write(data)
+        self._counters['written_bytes'] += n or 0
+        return n
+
+
+def _open(*args, **kwargs):
+    counters = _counters.get()
+    if counters is None:
+        return _real_open(*args, **kwargs)
+    started = time.perf_counter()
+    f = _real_open(*args, **kwargs)
+    counters['open'] += 1
+    counters['open_s'] += time.perf_counter() - started
+    return _CountingFile(f, counters)
+
+
+def _timed(real, name):
+    def wrapper(*args, **kwargs):
+        counters = _counters.get()
+        if counters is None:
+            return real(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return real(*args, **kwargs)
+        finally:
+            counters[name] += 1
+            counters[name + '_s'] += time.perf_counter() - started
+    wrapper.__wrapped__ = real
+    wrapper.__name__ = real.__name__
+    return wrapper
+
+
+def install():
+    """
+    Patch open, os.stat/lstat, os.listdir and os.scandir, and trace SQLite
+    connections opened afterwards (once per process)
+
+    os.path.exists/isfile/getsize and os.walk go through these, so they are
+    counted too. Outside an accounted request the patched functions call
+    straight through to the originals.
+    """
+    global _installed
+    if _installed:
+        return
+    builtins.open = _open
+    os.stat = _timed(_real_stat, 'stat')
+    os.lstat = _timed(_real_lstat, 'stat')
+    os.listdir = _timed(_real_listdir, 'scan')
+    os.scandir = _timed(_real_scandir, 'scan')
+    _installed = True
+
+
+def server_timing(counters, total):
+    """
+    Server-Timing header value for a request's counters
+
+    Args:
+        counters: Result of stop()
+        total: Seconds spent handling the request
+    """
+    parts = []
+    for metric, name, seconds in TIMING_METRICS:
+        if counters[name]:
+            parts.append(f'{metric};dur={counters[seconds] * 1000:.2f};desc="{counters[name]}"')
+    if counters['read_bytes'] or counters['written_bytes']:
+        parts.append(f'fs-bytes;desc="read={counters["read_bytes"]} written={counters["written_bytes"]}"')
+    if counters['db_connect']:
+        parts.append(f'db-connect;desc="{counters["db_connect"]}"')
+    parts.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(parts)
+
+
+def describe(counters):
+    """One-line summary for the slow-request log"""
+    return (f"opens={counters['open']} stats={counters['stat']} scans={counters['scan']} "
+            f"read={counters['read_bytes']}B written={counters['written_bytes']}B "
+            f"sql={counters['sql']} ({counters['sql_s'] * 1000:.1f}ms) connects={counters['db_connect']} "
+            f"fs={(counters['open_s'] + counters['stat_s'] + counters['scan_s']) * 1000:.1f}ms")
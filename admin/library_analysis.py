@@ -0,0 +1,184 @@
+"""
+Library Analysis Module
+Background job computing visual statistics (dominant colour, brightness,
+sharpness, aspect class) for every upload with vectorized NumPy operations
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from PIL import Image
+from config import Config
+import image_index
+
+# Side of the square thumbnails stacked into each batch array
+SAMPLE_SIZE = 128
+
+_lock = threading.Lock()
+_job = {
+    'running': False,
+    'total': 0,
+    'processed': 0,
+    'skipped': 0,
+    'errors': 0,
+    'started_at': None,
+    'finished_at': None,
+    'duration': None
+}
+
+
+def _list_uploads():
+    """All indexable images under the uploads folder"""
+    paths = []
+    for root, dirs, files in os.walk(Config.UPLOAD_FOLDER):
+        for file in files:
+            if file.lower().endswith(image_index.INDEXED_EXTENSIONS):
+                paths.append(os.path.join(root, file))
+    return sorted(paths)
+
+
+def _load_sample(full_path):
+    """Downscaled RGB copy of an image (JPEG decoding is done at reduced size)"""
+    with Image.open(full_path) as img:
+        img.draft('RGB', (SAMPLE_SIZE * 2, SAMPLE_SIZE * 2))
+        return img.convert('RGB').resize((SAMPLE_SIZE, SAMPLE_SIZE), Image.Resampling.BILINEAR)
+
+
+def aspect_class(width, height):
+    """Classify an image as landscape, portrait or square"""
+    ratio = width / height if height else 1
+    if ratio >= 1.2:
+        return 'landscape'
+    if ratio <= 1 / 1.2:
+        return 'portrait'
+    return 'square'
+
+
+def brightness_class(brightness):
+    """Classify mean brightness (0-1) as dark, medium or light"""
+    if brightness < Config.ANALYSIS_DARK_THRESHOLD:
+        return 'dark'
+    if brightness > Config.ANALYSIS_LIGHT_THRESHOLD:
+        return 'light'
+    return 'medium'
+
+
+def analyze_batch(samples):
+    """
+    Compute statistics for a batch of equally sized RGB samples
+
+    Args:
+        samples: list of PIL images of SAMPLE_SIZE x SAMPLE_SIZE
+
+    Returns:
+        list of dicts with dominant_color, brightness and sharpness
+    """
+    import numpy as np
+
+    batch = np.stack([np.asarray(s, dtype=np.uint8) for s in samples])  # (N, H, W, 3)
+    rgb = batch.astype(np.float32) / 255.0
+
+    # Mean perceived brightness (Rec. 601 luma)
+    luma = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)  # (N, H, W)
+    brightness = luma.mean(axis=(1, 2))
+
+    # Sharpness: variance of the 4-neighbour Laplacian (0-255 luma scale)
+    gray = luma * 255.0
+    laplacian = (
+        gray[:, :-2, 1:-1] + gray[:, 2:, 1:-1] + gray[:, 1:-1, :-2] + gray[:, 1:-1, 2:]
+        - 4 * gray[:, 1:-1, 1:-1]
+    )
+    sharpness = laplacian.var(axis=(1, 2))
+
+    # Dominant colour: most common bin of a 4-bit-per-channel histogram
+    bins = (batch >> 4).astype(np.int32)
+    codes = (bins[..., 0] << 8) | (bins[..., 1] << 4) | bins[..., 2]  # (N, H, W)
+    offsets = (np.arange(len(samples), dtype=np.int32) * 4096)[:, None, None]
+    counts = np.bincount((codes + offsets).ravel(), minlength=len(samples) * 4096)
+    dominant = counts.reshape(len(samples), 4096).argmax(axis=1)
+
+    results = []
+    for i in range(len(samples)):
+        code = int(dominant[i])
+        r, g, b = ((code >> 8) & 15) * 16 + 8, ((code >> 4) & 15) * 16 + 8, (code & 15) * 16 + 8
+        results.append({
+            'dominant_color': f'#{r:02x}{g:02x}{b:02x}',
+            'brightness': round(float(brightness[i]), 4),
+            'sharpness': round(float(sharpness[i]), 1)
+        })
+    return results
+
+
+def _run(force):
+    started = time.time()
+    try:
+        paths = _list_uploads()
+        with _lock:
+            _job['total'] = len(paths)
+
+        batch_size = Config.ANALYSIS_BATCH_SIZE
+        for start in range(0, len(paths), batch_size):
+            samples, entries = [], []
+            for full_path in paths[start:start + batch_size]:
+                try:
+                    metadata = image_index.get_image_metadata(full_path)
+                    if not metadata or (metadata.get('analysis') and not force):
+                        with _lock:
+                            _job['skipped'] += 1
+                        continue
+                    samples.append(_load_sample(full_path))
+                    entries.append((full_path, metadata))
+                except Exception as e:
+                    print(f"Error analyzing {full_path}: {e}")
+                    with _lock:
+                        _job['errors'] += 1
+
+            if samples:
+                results = {}
+                for (full_path, metadata), stats in zip(entries, analyze_batch(samples)):
+                    stats['brightness_class'] = brightness_class(stats['brightness'])
+                    stats['aspect'] = aspect_class(metadata['width'], metadata['height'])
+                    results[full_path] = stats
+                image_index.store_analysis(results)
+
+            with _lock:
+                _job['processed'] = min(start + batch_size, len(paths))
+    except Exception as e:
+        print(f"Library analysis failed: {e}")
+    finally:
+        with _lock:
+            _job['running'] = False
+            _job['finished_at'] = datetime.now().isoformat()
+            _job['duration'] = round(time.time() - started, 2)
+
+
+def start_analysis(force=False):
+    """
+    Start the analysis job in a background thread (no-op if already running)
+
+    Args:
+        force: Re-analyze images that already have statistics
+
+    Returns:
+        dict: current job status
+    """
+    with _lock:
+        if not _job['running']:
+            _job.update({
+                'running': True,
+                'total': 0,
+                'processed': 0,
+                'skipped': 0,
+                'errors': 0,
+                'started_at': datetime.now().isoformat(),
+                'finished_at': None,
+                'duration': None
+            })
+            threading.Thread(target=_run, args=(force,), daemon=True, name='library-analysis').start()
+    return get_status()
+
+
+def get_status():
+    """Snapshot of the analysis job progress"""
+    with _lock:
+        return dict(_job)
@@ -0,0 +1,144 @@
+"""
+Log Handlers Module
+Request threads only put records on a bounded queue; a listener thread
+writes them to a rotating file, and rotated files are gzipped in the
+background
+"""
+import os
+import gzip
+import json
+import queue
+import atexit
+import shutil
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_compressor = None
+
+
+def _get_compressor():
+    global _compressor
+    if _compressor is None:
+        _compressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='log-compress')
+    return _compressor
+
+
+def _gzip_file(source, dest):
+    with open(source, 'rb') as src, gzip.open(dest + '.tmp', 'wb') as out:
+        shutil.copyfileobj(src, out)
+    os.replace(dest + '.tmp', dest)
+    os.remove(source)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _CompressingMixin:
+    """Rotated files are renamed at once and gzipped on a background thread"""
+
+    def _init_compression(self):
+        self.namer = lambda name: name + '.gz'
+        self.rotator = self._rotate
+        self._compressing = None
+
+    def _rotate(self, source, dest):
+        pending = dest + '.pending'
+        os.replace(source, pending)
+        try:
+            self._compressing = _get_compressor().submit(_gzip_file, pending, dest)
+        except RuntimeError:
+            # Interpreter shutting down: the pool no longer accepts work
+            _gzip_file(pending, dest)
+
+    def doRollover(self):
+        # Backups are renamed during rollover, so the last one must be finished
+        if self._compressing is not None:
+            try:
+                self._compressing.result()
+            except OSError as e:
+                print(f"Error compressing rotated log: {e}")
+            self._compressing = None
+        super().doRollover()
+
+
+class CompressingRotatingFileHandler(_CompressingMixin, logging.handlers.RotatingFileHandler):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_compression()
+
+
+class CompressingTimedRotatingFileHandler(_CompressingMixin, logging.handlers.TimedRotatingFileHandler):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_compression()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Drops records when the queue is full rather than blocking the caller"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+def _file_handler(path):
+    if Config.LOG_ROTATION == 'time':
+        return CompressingTimedRotatingFileHandler(path, when=Config.LOG_ROTATE_WHEN,
+                                                   backupCount=Config.LOG_BACKUP_COUNT, encoding='utf-8')
+    return CompressingRotatingFileHandler(path, maxBytes=Config.LOG_MAX_BYTES,
+                                          backupCount=Config.LOG_BACKUP_COUNT, encoding='utf-8')
+
+
+def configure_logging(level=logging.INFO):
+    """
+    Route the root logger through a queue to the file and console handlers
+
+    Returns:
+        QueueListener: the running listener (stopped at exit, flushing the queue)
+    """
+    os.makedirs(Config.LOG_FOLDER, exist_ok=True)
+    formatter = JsonFormatter() if Config.LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT)
+
+    handlers = [_file_handler(os.path.join(Config.LOG_FOLDER, 'admin.log')), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    root.addHandler(DroppingQueueHandler(log_queue))
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+
+    def shutdown():
+        listener.stop()
+        for handler in handlers:
+            handler.close()
+        if _compressor is not None:
+            _compressor.shutdown(wait=True)
+
+    atexit.register(shutdown)
+    return listener
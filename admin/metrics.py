@@ -0,0 +1,171 @@
+"""
+Metrics Module
+Per-endpoint request latency histograms, in-flight counts, status codes and
+response sizes, exported as Prometheus text or JSON
+"""
+import time
+import bisect
+import threading
+import http_client
+
+# Histogram bucket upper bounds (seconds)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED = '<unmatched>'
+
+_routes = {}
+_lock = threading.Lock()
+_started_at = time.time()
+
+
+def _entry(endpoint):
+    entry = _routes.get(endpoint)
+    if entry is None:
+        entry = _routes[endpoint] = {
+            'count': 0,
+            'inflight': 0,
+            'sum': 0.0,
+            'max': 0.0,
+            'buckets': [0] * (len(LATENCY_BUCKETS) + 1),  # last bucket is +Inf
+            'statuses': {},
+            'bytes': 0
+        }
+    return entry
+
+
+def request_started(endpoint):
+    """Count a request as in flight; returns the start time to pass to request_finished"""
+    with _lock:
+        _entry(endpoint or UNMATCHED)['inflight'] += 1
+    return time.perf_counter()
+
+
+def request_finished(endpoint, started, status, size):
+    """
+    Record a finished request
+
+    Args:
+        endpoint: Flask endpoint name (None for unmatched URLs)
+        started: Value returned by request_started
+        status: HTTP status code
+        size: Response body size in bytes, or None if unknown (streamed)
+    """
+    elapsed = time.perf_counter() - started
+    index = bisect.bisect_left(LATENCY_BUCKETS, elapsed)
+    with _lock:
+        entry = _entry(endpoint or UNMATCHED)
+        entry['inflight'] -= 1
+        entry['count'] += 1
+        entry['sum'] += elapsed
+        entry['max'] = max(entry['max'], elapsed)
+        entry['buckets'][index] += 1
+        entry['statuses'][status] = entry['statuses'].get(status, 0) + 1
+        if size:
+            entry['bytes'] += size
+
+
+def _snapshot():
+    with _lock:
+        return {endpoint: dict(entry, buckets=list(entry['buckets']), statuses=dict(entry['statuses']))
+                for endpoint, entry in _routes.items()}
+
+
+def _quantile(buckets, count, q, maximum):
+    """Estimate a quantile (seconds) by interpolating within histogram buckets"""
+    if not count:
+        return 0.0
+    rank = q * count
+    seen = 0
+    for i, n in enumerate(buckets):
+        if seen + n >= rank and n:
+            lower = LATENCY_BUCKETS[i - 1] if i else 0.0
+            upper = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1]
+            return min(lower + (upper - lower) * (rank - seen) / n, maximum)
+        seen += n
+    return maximum
+
+
+def get_metrics():
+    """
+    Summary for the dashboard
+
+    Returns:
+        dict with uptime, routes (per endpoint: count, inflight, statuses,
+        bytes, avg/p50/p95/max latency in ms) and outbound (http_client metrics)
+    """
+    routes = {}
+    for endpoint, entry in _snapshot().items():
+        count = entry['count']
+        routes[endpoint] = {
+            'count': count,
+            'inflight': entry['inflight'],
+            'statuses': entry['statuses'],
+            'bytes': entry['bytes'],
+            'avg_ms': round(entry['sum'] / count * 1000, 2) if count else 0,
+            'p50_ms': round(_quantile(entry['buckets'], count, 0.5, entry['max']) * 1000, 2),
+            'p95_ms': round(_quantile(entry['buckets'], count, 0.95, entry['max']) * 1000, 2),
+            'max_ms': round(entry['max'] * 1000, 2)
+        }
+    return {
+        'uptime': round(time.time() - _started_at),
+        'routes': routes,
+        'outbound': http_client.get_metrics()
+    }
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format"""
+    routes = _snapshot()
+    lines = [
+        '# HELP admin_http_request_duration_seconds Request latency by endpoint',
+        '# TYPE admin_http_request_duration_seconds histogram'
+    ]
+    for endpoint, entry in sorted(routes.items()):
+        name = _label(endpoint)
+        cumulative = 0
+        for bound, n in zip(LATENCY_BUCKETS + ('+Inf',), entry['buckets']):
+            cumulative += n
+            lines.append(f'admin_http_request_duration_seconds_bucket{{endpoint="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'admin_http_request_duration_seconds_sum{{endpoint="{name}"}} {entry["sum"]:.6f}')
+        lines.append(f'admin_http_request_duration_seconds_count{{endpoint="{name}"}} {entry["count"]}')
+
+    lines += ['# HELP admin_http_requests_total Finished requests by endpoint and status',
+              '# TYPE admin_http_requests_total counter']
+    for endpoint, entry in sorted(routes.items()):
+        for status, n in sorted(entry['statuses'].items()):
+            lines.append(f'admin_http_requests_total{{endpoint="{_label(endpoint)}",status="{status}"}} {n}')
+
+    lines += ['# HELP admin_http_requests_in_flight Requests currently being handled',
+              '# TYPE admin_http_requests_in_flight gauge']
+    for endpoint, entry in sorted(routes.items()):
+        lines.append(f'admin_http_requests_in_flight{{endpoint="{_label(endpoint)}"}} {entry["inflight"]}')
+
+    lines += ['# HELP admin_http_response_bytes_total Response body bytes (streamed bodies excluded)',
+              '# TYPE admin_http_response_bytes_total counter']
+    for endpoint, entry in sorted(routes.items()):
+        lines.append(f'admin_http_response_bytes_total{{endpoint="{_label(endpoint)}"}} {entry["bytes"]}')
+
+    outbound = http_client.get_metrics()
+    lines += ['# HELP admin_outbound_responses_total Outbound HTTP responses by metric and status',
+              '# TYPE admin_outbound_responses_total counter']
+    for metric, entry in sorted(outbound.items()):
+        for status, n in sorted(entry['statuses'].items()):
+            lines.append(f'admin_outbound_responses_total{{metric="{_label(metric)}",status="{status}"}} {n}')
+
+    lines += ['# HELP admin_outbound_errors_total Outbound calls that failed (connection errors and 5xx/429)',
+              '# TYPE admin_outbound_errors_total counter']
+    for metric, entry in sorted(outbound.items()):
+        lines.append(f'admin_outbound_errors_total{{metric="{_label(metric)}"}} {entry["errors"]}')
+
+    lines += ['# HELP admin_outbound_request_duration_ms Recent outbound call latency',
+              '# TYPE admin_outbound_request_duration_ms summary']
+    for metric, entry in sorted(outbound.items()):
+        name = _label(metric)
+        lines.append(f'admin_outbound_request_duration_ms{{metric="{name}",quantile="0.5"}} {entry["p50_ms"]}')
+        lines.append(f'admin_outbound_request_duration_ms{{metric="{name}",quantile="0.95"}} {entry["p95_ms"]}')
+        lines.append(f'admin_outbound_request_duration_ms_count{{metric="{name}"}} {entry["count"]}')
+
+    return '\n'.join(lines) + '\n'
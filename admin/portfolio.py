@@ -6,6 +6,7 @@ import os
 import json
 from datetime import datetime
 from config import Config
+import stats
 
 # ============================================================================
 # Services Management
@@ -56,6 +57,7 @@ def save_service(service_id, data):
     
     with open(filepath, 'w') as f:
         json.dump(data, f, indent=2)
+    stats.file_saved(filepath)
     
     return {'success': True, 'message': f'Service "{data.get("title", service_id)}" saved'}
 
@@ -65,6 +67,7 @@ def delete_service(service_id):
     
     if os.path.exists(filepath):
         os.remove(filepath)
+        stats.file_deleted(filepath)
         return {'success': True, 'message': 'Service deleted'}
     
     return {'success': False, 'error': 'Service not found'}
@@ -126,6 +129,7 @@ def save_case_study(case_id, data):
     
     with open(filepath, 'w') as f:
         json.dump(data, f, indent=2)
+    stats.file_saved(filepath)
     
     return {'success': True, 'message': f'Case study "{data.get("title", case_id)}" saved'}
 
@@ -135,6 +139,7 @@ def delete_case_study(case_id):
     
     if os.path.exists(filepath):
         os.remove(filepath)
+        stats.file_deleted(filepath)
         return {'success': True, 'message': 'Case study deleted'}
     
     return {'success': False, 'error': 'Case study not found'}
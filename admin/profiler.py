@@ -0,0 +1,213 @@
+"""
+Profiler Module
+Opt-in cProfile sampling of admin requests: a fraction of requests (or
+requests carrying a signed X-Profile header) are profiled, and the results
+are kept in a bounded ring buffer on disk with top-N summaries
+"""
+import os
+import re
+import hmac
+import json
+import time
+import random
+import pstats
+import marshal
+import cProfile
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ID = re.compile(r'^\d+-[\w.-]+$')
+UNSAFE_CHARS = re.compile(r'[^\w.-]')
+
+_writer = None
+_writer_lock = threading.Lock()
+# cProfile sees every thread (and on 3.12+ refuses a second active profiler),
+# so only one request is profiled at a time
+_active = threading.Lock()
+
+
+def sign_request(path, ttl=300):
+    """
+    Value for the X-Profile header that forces profiling of a request
+
+    Args:
+        path: Request path (e.g. '/admin/content/edit/home')
+        ttl: Seconds the signature stays valid
+
+    Returns:
+        str: '<expiry>.<signature>'
+    """
+    expires = int(time.time()) + ttl
+    signature = hmac.new(Config.PROFILE_SECRET.encode(), f'{expires}:{path}'.encode(), hashlib.sha256).hexdigest()
+    return f'{expires}.{signature}'
+
+
+def _valid_signature(value, path):
+    if not Config.PROFILE_SECRET or not value or '.' not in value:
+        return False
+    expires, signature = value.split('.', 1)
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    expected = hmac.new(Config.PROFILE_SECRET.encode(), f'{expires}:{path}'.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(signature, expected)
+
+
+def start(request):
+    """
+    Start profiling the current request if it is sampled or signed
+
+    Skipped while another request is being profiled.
+
+    Returns:
+        tuple: (cProfile.Profile, trigger) or None when not profiled
+    """
+    if _valid_signature(request.headers.get(PROFILE_HEADER), request.path):
+        trigger = 'header'
+    elif Config.PROFILE_SAMPLE_RATE and random.random() < Config.PROFILE_SAMPLE_RATE:
+        trigger = 'sample'
+    else:
+        return None
+    if not _active.acquire(blocking=False):
+        return None
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Another profiler (a debugger, or cProfile run around the server) is active
+        _active.release()
+        return None
+    return profile, trigger
+
+
+def _get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='profile-writer')
+        return _writer
+
+
+def summarize(stats, limit=None):
+    """Top functions by cumulative time from pstats data"""
+    rows = []
+    for (filename, line, name), (primitive, calls, tottime, cumtime, _) in stats.items():
+        rows.append({
+            'function': f'{os.path.basename(filename)}:{line}({name})' if line else name,
+            'file': filename,
+            'calls': calls,
+            'primitive_calls': primitive,
+            'tottime_ms': round(tottime * 1000, 3),
+            'cumtime_ms': round(cumtime * 1000, 3)
+        })
+    rows.sort(key=lambda row: row['cumtime_ms'], reverse=True)
+    return rows[:limit or Config.PROFILE_TOP_N]
+
+
+def _write(profile_id, stats, summary):
+    folder = Config.PROFILE_FOLDER
+    os.makedirs(folder, exist_ok=True)
+    base = os.path.join(folder, profile_id)
+    # Same format as Profile.dump_stats, readable with pstats/snakeviz
+    with open(base + '.prof.tmp', 'wb') as f:
+        marshal.dump(stats, f)
+    os.replace(base + '.prof.tmp', base + '.prof')
+
+    summary['top'] = summarize(stats)
+    with open(base + '.json.tmp', 'w') as f:
+        json.dump(summary, f)
+    os.replace(base + '.json.tmp', base + '.json')
+
+    # Ring buffer: drop the oldest profiles beyond PROFILE_KEEP
+    ids = sorted(name[:-5] for name in os.listdir(folder) if name.endswith('.json'))
+    for old in ids[:-Config.PROFILE_KEEP]:
+        for ext in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(folder, old + ext))
+            except OSError:
+                pass
+
+
+def finish(active, request, status, duration):
+    """
+    Stop profiling and hand the result to the background writer
+
+    Args:
+        active: Value returned by start()
+        request: The profiled request
+        status: Response status code
+        duration: Seconds spent handling the request
+    """
+    profile, trigger = active
+    profile.disable()
+    _active.release()
+    profile.create_stats()
+    endpoint = request.endpoint or 'unmatched'
+    profile_id = f"{time.time_ns()}-{UNSAFE_CHARS.sub('_', endpoint)}"
+    summary = {
+        'id': profile_id,
+        'created': time.time(),
+        'endpoint': endpoint,
+        'method': request.method,
+        'path': request.path,
+        'status': status,
+        'duration_ms': round(duration * 1000, 2),
+        'trigger': trigger
+    }
+    try:
+        _get_writer().submit(_write, profile_id, profile.stats, summary)
+    except RuntimeError:
+        pass  # shutting down
+
+
+def cancel(active):
+    """Stop profiling a request that failed before producing a response"""
+    active[0].disable()
+    _active.release()
+
+
+def list_profiles():
+    """Stored profile summaries (without function tables), newest first"""
+    profiles = []
+    try:
+        names = os.listdir(Config.PROFILE_FOLDER)
+    except OSError:
+        return profiles
+    for name in sorted(names, reverse=True):
+        if name.endswith('.json'):
+            summary = get_profile(name[:-5])
+            if summary:
+                summary.pop('top', None)
+                profiles.append(summary)
+    return profiles
+
+
+def get_profile(profile_id, limit=None):
+    """
+    A stored profile's summary, or None
+
+    Args:
+        profile_id: Profile id from list_profiles()
+        limit: Recompute the top functions with this many rows from the raw profile
+    """
+    if not PROFILE_ID.match(profile_id or ''):
+        return None
+    base = os.path.join(Config.PROFILE_FOLDER, profile_id)
+    try:
+        with open(base + '.json', 'r') as f:
+            summary = json.load(f)
+        if limit:
+            summary['top'] = summarize(pstats.Stats(base + '.prof').stats, limit)
+        return summary
+    except (OSError, ValueError, EOFError):
+        return None
+
+
+def profile_path(profile_id):
+    """Path of a stored raw profile, or None"""
+    if not PROFILE_ID.match(profile_id or ''):
+        return None
+    path = os.path.join(Config.PROFILE_FOLDER, f'{profile_id}.prof')
+    return path if os.path.exists(path) else None
@@ -0,0 +1,144 @@
+"""
+Rate Limit Module
+Sliding-window counters with O(1) updates, kept in memory or shared through SQLite
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from config import Config
+import db
+
+
+def _estimate(window_index, current, previous, now, window):
+    """
+    Sliding-window count from two fixed windows
+
+    The previous window's count is weighted by how much of it still
+    overlaps the sliding window ending now.
+    """
+    now_index = int(now // window)
+    if window_index == now_index:
+        overlap = 1 - (now % window) / window
+        return current + previous * overlap
+    if window_index == now_index - 1:
+        overlap = 1 - (now % window) / window
+        return current * overlap
+    return 0
+
+
+class MemoryLimiter:
+    """
+    Per-process counters: key -> [window index, current count, previous count]
+
+    Keys are kept in least-recently-used order; beyond max_keys the
+    oldest are dropped, and keys idle for two windows are dropped
+    as they reach the front.
+    """
+
+    def __init__(self, window, max_keys):
+        self.window = window
+        self.max_keys = max_keys
+        self._counters = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now_index):
+        """Drop idle and excess keys from the least recently used end (lock held)"""
+        while self._counters:
+            key, entry = next(iter(self._counters.items()))
+            if len(self._counters) <= self.max_keys and entry[0] >= now_index - 1:
+                break
+            self._counters.popitem(last=False)
+
+    def hit(self, key, now=None):
+        """Count one event for a key"""
+        now = time.time() if now is None else now
+        now_index = int(now // self.window)
+        with self._lock:
+            entry = self._counters.get(key)
+            if entry is None:
+                self._counters[key] = [now_index, 1, 0]
+            else:
+                if entry[0] == now_index - 1:
+                    entry[:] = [now_index, 1, entry[1]]
+                elif entry[0] != now_index:
+                    entry[:] = [now_index, 1, 0]
+                else:
+                    entry[1] += 1
+                self._counters.move_to_end(key)
+            self._evict(now_index)
+
+    def count(self, key, now=None):
+        """Events for a key within the last window (estimated)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._counters.get(key)
+            if entry is None:
+                return 0
+            return _estimate(*entry, now, self.window)
+
+    def reset(self, key):
+        with self._lock:
+            self._counters.pop(key, None)
+
+
+class SQLiteLimiter:
+    """
+    Counters in a SQLite table so every worker process sees the same counts
+
+    Each hit is a single UPSERT; idle rows are pruned every prune_every hits.
+    """
+
+    UPSERT = '''
+        INSERT INTO rate_limits (key, window_index, current, previous) VALUES (?, ?, 1, 0)
+        ON CONFLICT(key) DO UPDATE SET
+            previous = CASE
+                WHEN window_index = excluded.window_index THEN previous
+                WHEN window_index = excluded.window_index - 1 THEN current
+                ELSE 0 END,
+            current = CASE WHEN window_index = excluded.window_index THEN current + 1 ELSE 1 END,
+            window_index = excluded.window_index
+    '''
+    SELECT = 'SELECT window_index, current, previous FROM rate_limits WHERE key = ?'
+    PRUNE = 'DELETE FROM rate_limits WHERE window_index < ?'
+    DELETE = 'DELETE FROM rate_limits WHERE key = ?'
+
+    def __init__(self, path, window, prune_every=256):
+        self.path = path
+        self.window = window
+        self.prune_every = prune_every
+        self._hits = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with db.transaction(path) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS rate_limits (
+                    key TEXT PRIMARY KEY,
+                    window_index INTEGER NOT NULL,
+                    current INTEGER NOT NULL,
+                    previous INTEGER NOT NULL
+                )
+            ''')
+
+    def hit(self, key, now=None):
+        now = time.time() if now is None else now
+        now_index = int(now // self.window)
+        with db.transaction(self.path) as conn:
+            conn.execute(self.UPSERT, (key, now_index))
+            self._hits += 1
+            if self._hits % self.prune_every == 0:
+                conn.execute(self.PRUNE, (now_index - 1,))
+
+    def count(self, key, now=None):
+        now = time.time() if now is None else now
+        row = db.query_one(self.SELECT, (key,), path=self.path)
+        return _estimate(*row, now, self.window) if row else 0
+
+    def reset(self, key):
+        db.execute(self.DELETE, (key,), path=self.path)
+
+
+def create_limiter(window):
+    """Limiter using the configured backend ('memory' or 'sqlite')"""
+    if Config.RATE_LIMIT_BACKEND == 'sqlite':
+        return SQLiteLimiter(Config.RATE_LIMIT_DATABASE, window)
+    return MemoryLimiter(window, Config.RATE_LIMIT_MAX_KEYS)
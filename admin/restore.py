@@ -0,0 +1,210 @@
+"""
+Restore Module
+Differential restore of backup archives: member paths are validated, each
+file is compared with the live tree by hash, and only files that differ are
+written (through a temporary file and an atomic rename)
+"""
+import os
+import json
+import time
+import hashlib
+import zipfile
+import tarfile
+import tempfile
+import threading
+import backup_store
+import watcher
+
+CHUNK_SIZE = 256 * 1024
+SPOOL_SIZE = 8 * 1024 * 1024  # same-size members are compared in memory up to this size
+
+
+class RestoreError(Exception):
+    """Raised when an archive cannot be restored"""
+
+
+def resolve_member(name):
+    """
+    Live path for an archive member, or None if the member must not be written
+
+    Only regular paths under one of the backup roots (data/, uploads/) are
+    accepted: absolute paths, drive letters, backslashes and '..' segments
+    are refused.
+    """
+    if not name or name.startswith('/') or '\\' in name or ':' in name or '\0' in name:
+        return None
+    parts = name.split('/')
+    if any(part in ('', '.', '..') for part in parts) or len(parts) < 2:
+        return None
+    root = backup_store.backup_roots().get(parts[0])
+    if root is None:
+        return None
+    root = os.path.abspath(root)
+    target = os.path.abspath(os.path.join(root, *parts[1:]))
+    if not target.startswith(root + os.sep):
+        return None
+    return target
+
+
+def _write_atomic(chunks, target):
+    """Write chunks to a temporary file beside target, then rename it into place"""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temp_path = f"{target}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(temp_path, target)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _read_chunks(reader):
+    return iter(lambda: reader.read(CHUNK_SIZE), b'')
+
+
+def _restore_member(reader, size, target, live):
+    """
+    Restore one member if it differs from the live file
+
+    Args:
+        reader: File object with the member's contents
+        size: Member size from the archive header
+        target: Live path to write
+        live: Snapshot entry of the live file ({hash, size, ...}) or None
+
+    Returns:
+        bool: whether the file was written
+    """
+    if live is None or live['size'] != size:
+        _write_atomic(_read_chunks(reader), target)
+        return True
+
+    # Same size: hash the member first and only write it if the contents differ
+    sha = hashlib.sha256()
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+        for chunk in _read_chunks(reader):
+            sha.update(chunk)
+            spool.write(chunk)
+        if sha.hexdigest() == live['hash']:
+            return False
+        spool.seek(0)
+        _write_atomic(_read_chunks(spool), target)
+    return True
+
+
+def _zip_members(fileobj):
+    """Yield (name, size, reader factory) for the regular files of a ZIP"""
+    with zipfile.ZipFile(fileobj, 'r') as zipf:
+        for info in zipf.infolist():
+            if info.is_dir():
+                continue
+            if (info.external_attr >> 16) & 0o170000 == 0o120000:  # symlink
+                yield info.filename, info.file_size, None
+                continue
+            yield info.filename, info.file_size, lambda info=info: zipf.open(info)
+
+
+def _tar_members(fileobj):
+    """Yield (name, size, reader factory) for the regular files of a .tar.zst, in one pass"""
+    import zstandard
+
+    reader = zstandard.ZstdDecompressor().stream_reader(fileobj)
+    with tarfile.open(fileobj=reader, mode='r|') as tar:
+        for info in tar:
+            if info.isdir():
+                continue
+            if not info.isfile():
+                yield info.name, info.size, None
+                continue
+            yield info.name, info.size, lambda info=info: tar.extractfile(info)
+
+
+def is_supported(filename):
+    """Whether a backup file name is a format this engine can read"""
+    name = filename.lower()
+    return name.endswith('.zip') or name.endswith('.tar.zst')
+
+
+def restore_archive(fileobj, filename):
+    """
+    Restore a backup archive over the live data and uploads
+
+    The archive is read from fileobj as it is decompressed. A pre-restore
+    snapshot is taken first; its hashes are what members are compared with.
+    Files absent from the archive are left in place.
+
+    Args:
+        fileobj: Uploaded archive (a seekable file object for ZIPs)
+        filename: Original file name, used to pick the format
+
+    Returns:
+        dict with manifest, written, unchanged, rejected (unsafe member
+        names), changed (absolute paths) and seconds
+
+    Raises:
+        RestoreError: if the archive is unreadable or the safety snapshot fails
+    """
+    started = time.perf_counter()
+    name = filename.lower()
+    if name.endswith('.tar.zst'):
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            raise RestoreError("Restoring .tar.zst backups requires the zstandard package")
+        members = _tar_members(fileobj)
+    elif name.endswith('.zip'):
+        if not zipfile.is_zipfile(fileobj):
+            raise RestoreError("Invalid backup file")
+        fileobj.seek(0)
+        with zipfile.ZipFile(fileobj, 'r') as zipf:
+            if 'manifest.json' not in zipf.namelist():
+                raise RestoreError("Invalid backup file: missing manifest")
+        fileobj.seek(0)
+        members = _zip_members(fileobj)
+    else:
+        raise RestoreError("Invalid file type. Please upload a .zip or .tar.zst backup")
+
+    try:
+        live_files = backup_store.create_snapshot('pre-restore')['files']
+    except Exception as e:
+        print(f"Error creating safety snapshot: {e}")
+        raise RestoreError("Failed to create safety backup of current data")
+
+    manifest, changed, rejected, unchanged = {}, [], [], 0
+    try:
+        for member, size, open_member in members:
+            if member == 'manifest.json' and open_member is not None:
+                with open_member() as reader:
+                    manifest = json.loads(reader.read())
+                continue
+
+            target = resolve_member(member)
+            if target is None or open_member is None:
+                rejected.append(member)
+                continue
+
+            with open_member() as reader:
+                if _restore_member(reader, size, target, live_files.get(member)):
+                    changed.append(target)
+                else:
+                    unchanged += 1
+    except (zipfile.BadZipFile, tarfile.TarError, ValueError, EOFError) as e:
+        raise RestoreError(f"Error restoring backup: {e}")
+    finally:
+        # Caches must learn about whatever was written, even on a partial restore
+        if changed:
+            watcher.publish(changed)
+
+    if rejected:
+        print(f"Restore skipped unsafe archive members: {rejected[:10]}")
+
+    return {
+        'manifest': manifest,
+        'written': len(changed),
+        'unchanged': unchanged,
+        'rejected': rejected,
+        'changed': changed,
+        'seconds': round(time.perf_counter() - started, 3)
+    }
@@ -0,0 +1,147 @@
+"""
+Search Cache Module
+Two-tier (in-memory LRU + SQLite) TTL cache with stale-while-revalidate
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+import db
+
+
+class TwoTierCache:
+    """
+    Caches JSON-serializable values under string keys
+
+    Lookups hit the in-memory LRU first and fall back to a SQLite table
+    that survives restarts and is shared between worker processes.
+    Entries younger than ttl are fresh; entries up to ttl + stale_ttl old
+    are served while a background refresh fetches a new value.
+    """
+
+    def __init__(self, db_path, table, ttl, stale_ttl, max_entries):
+        self.db_path = db_path
+        self.table = table
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._memory = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._table_ready = False
+
+    def _ensure_table(self):
+        """Create the table on first use (connections come from db's pool)"""
+        if self._table_ready:
+            return
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with db.transaction(self.db_path) as conn:
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    stored_at REAL NOT NULL
+                )
+            ''')
+        self._table_ready = True
+
+    def _remember(self, key, stored_at, value):
+        """Put an entry in the memory tier (lock held)"""
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        Look up a key
+
+        Returns:
+            tuple: (value, state) where state is 'fresh', 'stale' or None (miss)
+        """
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry:
+                self._memory.move_to_end(key)
+
+        if entry is None:
+            try:
+                self._ensure_table()
+                row = db.query_one(f'SELECT value, stored_at FROM {self.table} WHERE key = ?', (key,),
+                                   path=self.db_path)
+            except sqlite3.Error as e:
+                print(f"Search cache read error: {e}")
+                row = None
+            if row is None:
+                return None, None
+            entry = (row[1], json.loads(row[0]))
+            with self._lock:
+                self._remember(key, *entry)
+
+        age = now - entry[0]
+        if age < self.ttl:
+            return entry[1], 'fresh'
+        if age < self.ttl + self.stale_ttl:
+            return entry[1], 'stale'
+        return None, None
+
+    def set(self, key, value):
+        """Store a value in both tiers"""
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, stored_at, value)
+
+        try:
+            self._ensure_table()
+            with db.transaction(self.db_path) as conn:
+                conn.execute(
+                    f'INSERT OR REPLACE INTO {self.table} (key, value, stored_at) VALUES (?, ?, ?)',
+                    (key, json.dumps(value), stored_at)
+                )
+                # Drop rows that can no longer be served
+                conn.execute(
+                    f'DELETE FROM {self.table} WHERE stored_at < ?',
+                    (stored_at - self.ttl - self.stale_ttl,)
+                )
+        except sqlite3.Error as e:
+            print(f"Search cache write error: {e}")
+
+    def refresh_async(self, key, fetch):
+        """
+        Refresh a stale key in the background (at most one refresh per key)
+
+        Args:
+            key: Cache key
+            fetch: Callable returning the new value, or None to keep the old one
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                value = fetch()
+                if value is not None:
+                    self.set(key, value)
+            except Exception as e:
+                print(f"Search cache refresh error: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+        try:
+            self._ensure_table()
+            db.execute(f'DELETE FROM {self.table}', path=self.db_path)
+        except sqlite3.Error as e:
+            print(f"Search cache clear error: {e}")
@@ -6,47 +6,43 @@ including CSRF protection (Flask built-in), rate limiting, and secure headers.
 """
 
 from functools import wraps
-from time import time
-from flask import request, abort
+from flask import abort
 import error_handler
 
-# Rate limiting storage (in-memory, for production use Redis or similar)
-login_attempts = {}
-RATE_LIMIT_WINDOW = 900  # 15 minutes in seconds
-MAX_LOGIN_ATTEMPTS = 5
+from config import Config
+import rate_limit
 
+# Login attempts per email and per client IP (shared between workers with the sqlite backend)
+login_limiter = rate_limit.create_limiter(Config.LOGIN_RATE_WINDOW)
 
-def check_rate_limit(email):
+
+def check_rate_limit(email, ip=None):
     """
     Check if user has exceeded login rate limit
     
+    Args:
+        email: Email being logged in to
+        ip: Client address, limited separately across all emails
+    
     Returns:
         bool: True if rate limit exceeded, False otherwise
     """
-    now = time()
-    
-    if email not in login_attempts:
-        login_attempts[email] = []
-    
-    # Remove old attempts outside the time window
-    login_attempts[email] = [
-        attempt_time for attempt_time in login_attempts[email]
-        if now - attempt_time < RATE_LIMIT_WINDOW
-    ]
-    
-    # Check if limit exceeded
-    if len(login_attempts[email]) >= MAX_LOGIN_ATTEMPTS:
+    if login_limiter.count(f'email:{email}') >= Config.LOGIN_MAX_ATTEMPTS:
         error_handler.log_error(f"Rate limit exceeded for {email}")
         return True
     
+    if ip and login_limiter.count(f'ip:{ip}') >= Config.LOGIN_MAX_ATTEMPTS_PER_IP:
+        error_handler.log_error(f"Rate limit exceeded for IP {ip}")
+        return True
+    
     return False
 
 
-def record_login_attempt(email):
+def record_login_attempt(email, ip=None):
     """Record a  login attempt for rate limiting"""
-    if email not in login_attempts:
-        login_attempts[email] = []
-    login_attempts[email].append(time())
+    login_limiter.hit(f'email:{email}')
+    if ip:
+        login_limiter.hit(f'ip:{ip}')
 
 
 def add_security_headers(response):
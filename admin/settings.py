@@ -7,7 +7,7 @@ and password management for the PhilanthroForge Admin Panel.
 
 import os
 import json
-import zipfile
+import time
 import shutil
 from datetime import datetime
 from werkzeug.security import check_password_hash, generate_password_hash
@@ -120,7 +120,6 @@ def update_password(username, current_password, new_password):
     """
     # Import here to avoid circular import
     import auth
-    import sqlite3
     
     # Get user by email (username is email in auth module)
     user = auth.get_user_by_email(username)
@@ -128,17 +127,12 @@ def update_password(username, current_password, new_password):
         return False, "User not found"
     
     # Get password hash to verify
-    conn = sqlite3.connect(Config.DATABASE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT password_hash FROM users WHERE id = ?', (user.id,))
-    row = cursor.fetchone()
-    conn.close()
-    
-    if not row:
+    password_hash = auth.get_password_hash(user.id)
+    if not password_hash:
         return False, "User not found"
     
     # Verify current password
-    if not auth.verify_password(current_password, row[0]):
+    if not auth.verify_password(current_password, password_hash):
         return False, "Current password is incorrect"
     
     # Validate new password
@@ -166,140 +160,128 @@ def update_password(username, current_password, new_password):
 
 def get_system_stats():
     """Get system statistics for dashboard"""
-    stats = {
-        "pages": 0,
-        "services": 0,
-        "case_studies": 0,
-        "images": 0,
-        "total_size": 0,
-        "last_edited": None
-    }
-    
-    # Count pages
-    pages_folder = os.path.join(Config.DATA_FOLDER, 'pages')
-    if os.path.exists(pages_folder):
-        stats["pages"] = len([f for f in os.listdir(pages_folder) if f.endswith('.json')])
-    
-    # Count services
-    if os.path.exists(Config.SERVICES_FOLDER):
-        stats["services"] = len([f for f in os.listdir(Config.SERVICES_FOLDER) if f.endswith('.json')])
-    
-    # Count case studies
-    if os.path.exists(Config.CASES_FOLDER):
-        stats["case_studies"] = len([f for f in os.listdir(Config.CASES_FOLDER) if f.endswith('.json')])
+    # Import here to avoid circular import
+    import stats
+    return stats.get_stats()
+
+
+def create_backup(archive_format=None):
+    """
+    Snapshot all data and uploads and export the snapshot as a streamed archive
     
-    # Count images and calculate size
-    upload_folder = Config.UPLOAD_FOLDER
-    if os.path.exists(upload_folder):
-        image_count = 0
-        total_size = 0
-        
-        for root, dirs, files in os.walk(upload_folder):
-            for file in files:
-                if file.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp')):
-                    image_count += 1
-                    file_path = os.path.join(root, file)
-                    total_size += os.path.getsize(file_path)
-        
-        stats["images"] = image_count
-        stats["total_size"] = total_size
+    Args:
+        archive_format: 'zip' or 'tar.zst' (defaults to Config.BACKUP_FORMAT;
+            falls back to zip when zstandard isn't installed)
     
-    # Get last edited file
-    all_json_files = []
-    for folder in [pages_folder, Config.SERVICES_FOLDER, Config.CASES_FOLDER]:
-        if os.path.exists(folder):
-            for file in os.listdir(folder):
-                if file.endswith('.json'):
-                    file_path = os.path.join(folder, file)
-                    all_json_files.append((file_path, os.path.getmtime(file_path)))
+    Returns:
+        tuple: (generator of archive bytes, download name, mimetype),
+        or (None, None, None) on error
+    """
+    import backup_store
     
-    if all_json_files:
-        latest_file = max(all_json_files, key=lambda x: x[1])
-        stats["last_edited"] = datetime.fromtimestamp(latest_file[1]).isoformat()
+    started = time.perf_counter()
+    try:
+        snapshot = backup_store.create_snapshot('download')
+    except Exception as e:
+        print(f"Error creating backup: {e}")
+        return None, None, None
     
-    return stats
+    return _export_snapshot(snapshot, archive_format, started, f"backup_{snapshot['backup_date']}")
+
 
+def list_backups():
+    """Stored snapshots (newest first) with a readable total size"""
+    import backup_store
+    snapshots = backup_store.list_snapshots()
+    for snapshot in snapshots:
+        snapshot['size_formatted'] = format_file_size(snapshot.get('total_size', 0))
+    return snapshots
 
-def create_backup():
+
+def export_snapshot(snapshot_id, archive_format=None):
     """
-    Create a backup ZIP file of all data
+    Export a stored snapshot (e.g. a pre-restore safety snapshot) as a
+    streamed archive that can be uploaded to restore it
     
     Returns:
-        str: Path to created backup file, or None on error
+        tuple: (generator of archive bytes, download name, mimetype),
+        or (None, None, None) if there is no such snapshot
     """
-    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-    backup_filename = f'backup_{timestamp}.zip'
-    backup_folder = os.path.join(os.path.dirname(Config.DATA_FOLDER), 'backups')
+    import backup_store
     
-    # Create backups folder if it doesn't exist
-    os.makedirs(backup_folder, exist_ok=True)
+    started = time.perf_counter()
+    snapshot = backup_store.get_snapshot(snapshot_id)
+    if snapshot is None:
+        return None, None, None
+    return _export_snapshot(snapshot, archive_format, started,
+                            f"backup_{snapshot['backup_date']}_{snapshot.get('label', 'snapshot')}")
+
+
+def _export_snapshot(snapshot, archive_format, started, name):
+    """Archive stream, download name and mimetype for a snapshot manifest"""
+    import archive
+    import backup_store
+    import error_handler
     
-    backup_path = os.path.join(backup_folder, backup_filename)
+    manifest = {
+        "backup_date": snapshot['backup_date'],
+        "snapshot": snapshot['id'],
+        "version": snapshot['version'],
+        "stats": get_system_stats(),
+        "timings": {"snapshot": round(time.perf_counter() - started, 3)}
+    }
+    members = [
+        (arcname, backup_store.object_path(entry['hash']), entry['size'], entry['mtime'])
+        for arcname, entry in snapshot['files'].items()
+    ]
     
-    try:
-        with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # Add data folder contents
-            if os.path.exists(Config.DATA_FOLDER):
-                for root, dirs, files in os.walk(Config.DATA_FOLDER):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, os.path.dirname(Config.DATA_FOLDER))
-                        zipf.write(file_path, arcname)
-            
-            # Add manifest
-            manifest = {
-                "backup_date": timestamp,
-                "version": "1.0",
-                "stats": get_system_stats()
-            }
-            zipf.writestr('manifest.json', json.dumps(manifest, indent=2))
-        
-        return backup_path
-    except Exception as e:
-        print(f"Error creating backup: {e}")
-        return None
+    archive_format = archive_format or Config.BACKUP_FORMAT
+    if archive_format == 'tar.zst' and archive.zstd_available():
+        stream = archive.stream_tar_zst(members, manifest)
+        extension, mimetype = 'tar.zst', 'application/zstd'
+    elif archive.needs_zip64(members):
+        stream = backup_store.stream_zip(snapshot, manifest)
+        extension, mimetype = 'zip', 'application/zip'
+    else:
+        stream = archive.stream_parallel_zip(members, manifest)
+        extension, mimetype = 'zip', 'application/zip'
+    
+    def logged():
+        yield from stream
+        manifest['timings']['total'] = round(time.perf_counter() - started, 3)
+        error_handler.log_info(f"Backup {snapshot['id']} ({extension}) timings: {manifest['timings']}")
+    
+    return logged(), f"{name}.{extension}", mimetype
 
 
-def restore_backup(zip_file_path):
+def restore_backup(fileobj, filename):
     """
-    Restore data from a backup ZIP file
+    Restore data from a backup archive, writing only files that differ
     
     Args:
-        zip_file_path: Path to the backup ZIP file
+        fileobj: Uploaded backup (.zip, or .tar.zst with zstandard installed)
+        filename: Original file name
     
     Returns:
         tuple: (success: bool, message: str)
     """
+    import restore
     try:
-        # Validate ZIP file
-        if not zipfile.is_zipfile(zip_file_path):
-            return False, "Invalid backup file"
-        
-        # Create backup of current data first
-        current_backup = create_backup()
-        if not current_backup:
-            return False, "Failed to create safety backup of current data"
-        
-        # Extract backup
-        with zipfile.ZipFile(zip_file_path, 'r') as zipf:
-            # Check for manifest
-            if 'manifest.json' not in zipf.namelist():
-                return False, "Invalid backup file: missing manifest"
-            
-            # Read manifest
-            manifest_data = zipf.read('manifest.json')
-            manifest = json.loads(manifest_data)
-            
-            # Extract data folder
-            data_base = os.path.dirname(Config.DATA_FOLDER)
-            for member in zipf.namelist():
-                if member != 'manifest.json':
-                    zipf.extract(member, data_base)
-        
-        return True, f"Backup restored successfully from {manifest.get('backup_date', 'unknown date')}"
-    
+        result = restore.restore_archive(fileobj, filename)
+    except restore.RestoreError as e:
+        return False, str(e)
     except Exception as e:
         return False, f"Error restoring backup: {str(e)}"
+    
+    from error_handler import log_info
+    log_info(f"Restored backup {filename}: {result['written']} written, {result['unchanged']} unchanged, "
+             f"{len(result['rejected'])} rejected in {result['seconds']}s")
+    
+    message = (f"Backup restored successfully from {result['manifest'].get('backup_date', 'unknown date')}: "
+               f"{result['written']} files updated, {result['unchanged']} unchanged")
+    if result['rejected']:
+        message += f", {len(result['rejected'])} unsafe entries skipped"
+    return True, message
 
 
 def format_file_size(size_bytes):
@@ -0,0 +1,165 @@
+"""
+Stats Module
+Dashboard counters kept up to date as the admin writes files, with
+periodic scandir reconciliation for changes made outside the admin
+"""
+import os
+import time
+import threading
+from datetime import datetime
+from config import Config
+import watcher
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp')
+
+_lock = threading.Lock()
+_json_files = {'pages': set(), 'services': set(), 'case_studies': set()}
+_images = {}  # absolute path -> size
+_state = {'total_size': 0, 'last_edited': None, 'reconciled_at': None}
+_reconciler = None
+_start_lock = threading.Lock()
+
+
+def _json_kind(full_path):
+    """Which counter a JSON file belongs to, or None"""
+    if not full_path.endswith('.json'):
+        return None
+    folder = os.path.dirname(os.path.abspath(full_path))
+    for kind, kind_folder in (('pages', Config.PAGES_FOLDER),
+                              ('services', Config.SERVICES_FOLDER),
+                              ('case_studies', Config.CASES_FOLDER)):
+        if folder == os.path.abspath(kind_folder):
+            return kind
+    return None
+
+
+def _is_upload(full_path):
+    return (full_path.lower().endswith(IMAGE_EXTENSIONS)
+            and os.path.abspath(full_path).startswith(os.path.abspath(Config.UPLOAD_FOLDER) + os.sep))
+
+
+def file_saved(full_path):
+    """Record a created or updated page, portfolio entry or upload"""
+    full_path = os.path.abspath(full_path)
+    kind = _json_kind(full_path)
+    if kind is None and not _is_upload(full_path):
+        return
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        return
+
+    with _lock:
+        if kind:
+            _json_files[kind].add(os.path.basename(full_path))
+            if _state['last_edited'] is None or stat.st_mtime > _state['last_edited']:
+                _state['last_edited'] = stat.st_mtime
+        else:
+            _state['total_size'] += stat.st_size - _images.get(full_path, 0)
+            _images[full_path] = stat.st_size
+
+
+def file_deleted(full_path):
+    """Record a deleted (or renamed-away) page, portfolio entry or upload"""
+    full_path = os.path.abspath(full_path)
+    with _lock:
+        kind = _json_kind(full_path)
+        if kind:
+            _json_files[kind].discard(os.path.basename(full_path))
+        elif full_path in _images:
+            _state['total_size'] -= _images.pop(full_path)
+
+
+def _on_files_changed(paths):
+    """Apply changes reported by the watcher"""
+    if paths is None:
+        reconcile()
+        return
+    for path in paths:
+        if os.path.exists(path):
+            file_saved(path)
+        else:
+            file_deleted(path)
+
+
+watcher.subscribe(_on_files_changed)
+
+
+def reconcile():
+    """Rebuild every counter from disk"""
+    json_files = {kind: set() for kind in _json_files}
+    last_edited = None
+    for kind, folder in (('pages', Config.PAGES_FOLDER),
+                         ('services', Config.SERVICES_FOLDER),
+                         ('case_studies', Config.CASES_FOLDER)):
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.json') and entry.is_file():
+                        json_files[kind].add(entry.name)
+                        mtime = entry.stat().st_mtime
+                        last_edited = mtime if last_edited is None else max(last_edited, mtime)
+        except OSError:
+            pass
+
+    images = {}
+    pending = [os.path.abspath(Config.UPLOAD_FOLDER)]
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                        images[entry.path] = entry.stat().st_size
+        except OSError:
+            pass
+
+    with _lock:
+        _json_files.update(json_files)
+        _images.clear()
+        _images.update(images)
+        _state['total_size'] = sum(images.values())
+        _state['last_edited'] = last_edited
+        _state['reconciled_at'] = time.time()
+
+
+def _reconcile_loop():
+    while True:
+        time.sleep(Config.STATS_RECONCILE_INTERVAL)
+        try:
+            reconcile()
+        except Exception as e:
+            print(f"Stats reconciliation failed: {e}")
+
+
+def _ensure_started():
+    """Reconcile once and start the periodic reconciler (first call only)"""
+    global _reconciler
+    if _reconciler is not None:
+        return
+    with _start_lock:
+        if _reconciler is None:
+            reconcile()
+            _reconciler = threading.Thread(target=_reconcile_loop, daemon=True, name='stats-reconcile')
+            _reconciler.start()
+
+
+def get_stats():
+    """
+    Current dashboard statistics (no filesystem access after the first call)
+
+    Returns:
+        dict with pages, services, case_studies, images, total_size and last_edited
+    """
+    _ensure_started()
+    with _lock:
+        last_edited = _state['last_edited']
+        return {
+            "pages": len(_json_files['pages']),
+            "services": len(_json_files['services']),
+            "case_studies": len(_json_files['case_studies']),
+            "images": len(_images),
+            "total_size": _state['total_size'],
+            "last_edited": datetime.fromtimestamp(last_edited).isoformat() if last_edited else None
+        }
@@ -0,0 +1,233 @@
+"""
+SVG Optimization Module
+Strips editor metadata, unused ids/defs and excess precision from uploaded SVGs
+"""
+import os
+import re
+import gzip
+import xml.etree.ElementTree as ET
+from config import Config
+
+SVG_NS = 'http://www.w3.org/2000/svg'
+XLINK_NS = 'http://www.w3.org/1999/xlink'
+
+# Namespaces written by design tools that browsers ignore
+EDITOR_NAMESPACES = {
+    'http://www.inkscape.org/namespaces/inkscape',
+    'http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd',
+    'http://www.bohemiancoding.com/sketch/ns',
+    'http://ns.adobe.com/AdobeIllustrator/10.0/',
+    'http://ns.adobe.com/AdobeSVGViewerExtensions/3.0/',
+    'http://ns.adobe.com/Extensibility/1.0/',
+    'http://ns.adobe.com/Graphs/1.0/',
+    'http://ns.adobe.com/SaveForWeb/1.0/',
+    'http://ns.adobe.com/Variables/1.0/',
+    'http://www.figma.com/figma/ns',
+    'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
+    'http://purl.org/dc/elements/1.1/',
+    'http://creativecommons.org/ns#'
+}
+
+# Attributes holding coordinates that can safely lose precision
+NUMERIC_ATTRIBUTES = {
+    'd', 'points', 'x', 'y', 'x1', 'y1', 'x2', 'y2', 'cx', 'cy',
+    'r', 'rx', 'ry', 'width', 'height', 'stroke-width'
+}
+
+# Elements whose text content is significant
+TEXT_ELEMENTS = {'text', 'tspan', 'textPath', 'style', 'title', 'desc', 'script'}
+
+NUMBER_RE = re.compile(r'-?(?:\d+\.\d*|\.\d+)(?:[eE][-+]?\d+)?')
+REFERENCE_RE = re.compile(r'url\(\s*["\']?#([^"\')\s]+)["\']?\s*\)')
+WHITESPACE_RE = re.compile(r'\s+')
+
+ET.register_namespace('', SVG_NS)
+ET.register_namespace('xlink', XLINK_NS)
+
+
+def _namespace(tag):
+    """Return the namespace URI of a Clark-notation tag or attribute name"""
+    if tag.startswith('{'):
+        return tag[1:].split('}', 1)[0]
+    return None
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _round_numbers(value, precision):
+    """
+    Round decimal numbers in an attribute value to the given precision
+
+    A dropped minus sign may have been the only separator from the previous
+    number, so it is replaced with a space:
+
+    >>> _round_numbers('M10-0.0001 L1.5-0.0001', 2)
+    'M10 0 L1.5 0'
+    """
+    def replace(match):
+        number = float(match.group(0))
+        text = f"{round(number, precision):.{precision}f}".rstrip('0').rstrip('.')
+        if text in ('-0', ''):
+            text = '0'
+        if text.startswith('0.'):
+            text = text[1:]
+        elif text.startswith('-0.'):
+            text = '-' + text[2:]
+        # "1.9999.5" -> "2 .5", not "2.5"
+        following = match.string[match.end():match.end() + 1]
+        if '.' not in text and following == '.':
+            text += ' '
+        # "1.5-0.0001" -> "1.5 0", not "1.50"
+        preceding = match.string[match.start() - 1:match.start()]
+        if match.group(0).startswith('-') and not text.startswith('-') and (preceding.isdigit() or preceding == '.'):
+            text = ' ' + text
+        return text
+
+    return NUMBER_RE.sub(replace, value)
+
+
+def _collect_references(root):
+    """Collect every id referenced via url(#id), href="#id" or CSS selectors"""
+    references = set()
+    for element in root.iter():
+        for name, value in element.attrib.items():
+            if _local_name(name) == 'href' and value.startswith('#'):
+                references.add(value[1:])
+            references.update(REFERENCE_RE.findall(value))
+        if _local_name(element.tag) == 'style' and element.text:
+            references.update(re.findall(r'#([\w-]+)', element.text))
+            references.update(REFERENCE_RE.findall(element.text))
+    return references
+
+
+def _strip_editor_data(element):
+    """Recursively drop metadata elements and editor-namespaced nodes"""
+    for child in list(element):
+        if not isinstance(child.tag, str):
+            element.remove(child)
+            continue
+        if _local_name(child.tag) == 'metadata' or _namespace(child.tag) in EDITOR_NAMESPACES:
+            element.remove(child)
+            continue
+        _strip_editor_data(child)
+
+    for name in list(element.attrib):
+        if _namespace(name) in EDITOR_NAMESPACES:
+            del element.attrib[name]
+
+
+def _drop_unused_ids(root, references):
+    """Remove unreferenced defs and ids"""
+    for defs in [e for e in root.iter() if _local_name(e.tag) == 'defs']:
+        for child in list(defs):
+            if child.get('id') not in references and _local_name(child.tag) != 'style':
+                defs.remove(child)
+
+    for element in root.iter():
+        if 'id' in element.attrib and element.get('id') not in references:
+            del element.attrib['id']
+
+    for parent in list(root.iter()):
+        for child in list(parent):
+            if _local_name(child.tag) == 'defs' and len(child) == 0:
+                parent.remove(child)
+
+
+def _minify(element, precision, preserve_space=False):
+    """Collapse whitespace and round coordinates in place"""
+    name = _local_name(element.tag)
+    preserve = preserve_space or element.get('{http://www.w3.org/XML/1998/namespace}space') == 'preserve'
+
+    for attr, value in element.attrib.items():
+        value = WHITESPACE_RE.sub(' ', value).strip()
+        if _local_name(attr) in NUMERIC_ATTRIBUTES:
+            value = _round_numbers(value, precision)
+        element.attrib[attr] = value
+
+    if name not in TEXT_ELEMENTS and not preserve:
+        if element.text and not element.text.strip():
+            element.text = None
+    for child in element:
+        if child.tail and not child.tail.strip() and name not in TEXT_ELEMENTS and not preserve:
+            child.tail = None
+        _minify(child, precision, preserve or name in TEXT_ELEMENTS)
+
+
+def optimize_svg_markup(markup, precision=None):
+    """
+    Optimize SVG markup
+
+    Args:
+        markup: SVG document as bytes or str
+        precision: Decimal places kept for coordinates
+
+    Returns:
+        bytes: optimized SVG document
+    """
+    if precision is None:
+        precision = Config.SVG_PRECISION
+
+    # The default parser already drops comments, processing instructions
+    # and the doctype
+    root = ET.fromstring(markup)
+    if _local_name(root.tag) != 'svg':
+        raise ValueError('Not an SVG document')
+
+    _strip_editor_data(root)
+    _drop_unused_ids(root, _collect_references(root))
+    _minify(root, precision)
+
+    return ET.tostring(root, encoding='utf-8', xml_declaration=False)
+
+
+def write_precompressed(svg_path):
+    """Write a gzip-compressed .svgz next to the SVG, returns its path"""
+    gzip_path = svg_path + 'z'
+    with open(svg_path, 'rb') as source:
+        data = source.read()
+    with open(gzip_path, 'wb') as f:
+        # mtime=0 keeps the output byte-identical for identical input
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    return gzip_path
+
+
+def optimize_svg(svg_path, precompress=True):
+    """
+    Optimize an SVG file in place
+
+    Args:
+        svg_path: Path to the .svg file
+        precompress: Also write a .svgz variant
+
+    Returns:
+        dict with success status and sizes
+    """
+    try:
+        original_size = os.path.getsize(svg_path)
+        with open(svg_path, 'rb') as f:
+            optimized = optimize_svg_markup(f.read())
+
+        # Keep the original if optimization did not help
+        if len(optimized) < original_size:
+            with open(svg_path, 'wb') as f:
+                f.write(optimized)
+
+        size = os.path.getsize(svg_path)
+        result = {
+            'success': True,
+            'original_size': original_size,
+            'size': size,
+            'saved_bytes': original_size - size
+        }
+
+        if precompress:
+            gzip_path = write_precompressed(svg_path)
+            result['gzip_path'] = gzip_path
+            result['gzip_size'] = os.path.getsize(gzip_path)
+
+        return result
+    except Exception as e:
+        print(f"Error optimizing SVG: {e}")
+        return {'success': False, 'error': str(e)}
@@ -3,15 +3,81 @@
 Unsplash API Integration Module
 """
 import os
-import requests
+import re
+import json
 import uuid
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import urlparse, quote
+import requests
 from config import Config
+from search_cache import TwoTierCache
+from disk_cache import DiskCache
+import http_client
+
+UNSPLASH_API_URL = Config.UNSPLASH_API_URL
+
+# Batch imports share one bounded pool; requests are also limited per host
+_import_executor = ThreadPoolExecutor(max_workers=Config.UNSPLASH_IMPORT_WORKERS, thread_name_prefix='unsplash-import')
+_import_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+# Proxied preview thumbnails
+thumb_cache = DiskCache(Config.THUMB_CACHE_FOLDER, Config.THUMB_CACHE_MAX_BYTES)
+
+# Opens after repeated failures; search then serves mock results until it recovers
+breaker = http_client.CircuitBreaker(
+    'unsplash',
+    failure_threshold=Config.UNSPLASH_BREAKER_THRESHOLD,
+    reset_timeout=Config.UNSPLASH_BREAKER_RESET
+)
 
-UNSPLASH_API_URL = "https://api.unsplash.com"
+search_cache = TwoTierCache(
+    Config.UNSPLASH_CACHE_DATABASE,
+    table='unsplash_search',
+    ttl=Config.UNSPLASH_CACHE_TTL,
+    stale_ttl=Config.UNSPLASH_CACHE_STALE_TTL,
+    max_entries=Config.UNSPLASH_CACHE_SIZE
+)
 
 def search_photos(query, page=1, per_page=12):
     """
-    Search photos on Unsplash
+    Search photos on Unsplash (cached by query, page and page size)
+    
+    page and per_page are integers; the route parses and clamps them
+    """
+    key = json.dumps([' '.join(query.lower().split()), page, per_page])
+    
+    cached, state = search_cache.get(key)
+    if state == 'fresh':
+        return cached
+    
+    if state == 'stale':
+        # Serve the stale result now and refresh it in the background
+        search_cache.refresh_async(key, lambda: _cacheable(fetch_search_results(query, page, per_page)))
+        return cached
+    
+    data = fetch_search_results(query, page, per_page)
+    if _cacheable(data):
+        search_cache.set(key, data)
+    return data
+
+def _cacheable(data):
+    """Only real API results are cached, never errors or mock fallbacks"""
+    if data.get('error') or data.get('is_mock'):
+        return None
+    return data
+
+def fetch_search_results(query, page=1, per_page=12):
+    """
+    Search photos on Unsplash (uncached API call)
     """
     headers = {
         "Authorization": f"Client-ID {Config.UNSPLASH_ACCESS_KEY}",
@@ -27,7 +93,7 @@ def search_photos(query, page=1, per_page=12):
     try:
         url = f"{UNSPLASH_API_URL}/search/photos"
         # print(f"DEBUG: Requesting {url} with query '{query}'")
-        response = requests.get(url, headers=headers, params=params)
+        response = http_client.get(url, metric='unsplash.search', breaker=breaker, headers=headers, params=params)
         
         # Automatic Fallback on Auth Error
         if response.status_code in [401, 403]:
@@ -46,7 +112,7 @@ def search_photos(query, page=1, per_page=12):
         for photo in data.get('results', []):
             results.append({
                 "id": photo['id'],
-                "thumb": photo['urls']['thumb'],
+                "thumb": thumb_proxy_url(photo['urls']['thumb']),
                 "regular": photo['urls']['regular'],
                 "download_location": photo['links']['download_location'],
                 "photographer": photo['user']['name'],
@@ -61,12 +127,14 @@ def search_photos(query, page=1, per_page=12):
             "is_mock": False
         }
         
+    except http_client.CircuitOpenError:
+        # Repeated failures: keep the picker usable with demo data
+        return get_mock_unsplash_results(query, is_fallback=True, reason="Unsplash unavailable - Showing Demo Data")
     except requests.RequestException as e:
         print(f"Unsplash API Exception: {e}")
-        # Fallback on connection error too
-        return get_mock_unsplash_results(query, is_fallback=True)
+        return {"error": "Unsplash is unreachable, please try again", "results": []}
 
-def get_mock_unsplash_results(query, is_fallback=False):
+def get_mock_unsplash_results(query, is_fallback=False, reason=None):
     """Return mock results using Placehold.co"""
     results = []
     topics = ['Nature', 'Office', 'Technology', 'People', 'Meeting', 'Building']
@@ -82,7 +150,7 @@ def get_mock_unsplash_results(query, is_fallback=False):
         
         results.append({
             "id": f"mock-{i}-{topic}",
-            "thumb": thumb_url,
+            "thumb": thumb_proxy_url(thumb_url),
             "regular": download_url,
             "download_location": download_url, 
             "photographer": "System Mock",
@@ -95,86 +163,299 @@ def get_mock_unsplash_results(query, is_fallback=False):
         "total_pages": 1,
         "results": results,
         "is_mock": True,
-        "message": "Invalid API Key - Showing Demo Data" if is_fallback else "Demo Mode"
+        "message": reason or ("Invalid API Key - Showing Demo Data" if is_fallback else "Demo Mode")
     }
 
-def download_photo(download_location, photo_id):
+# ============================================================================
+# Thumbnail proxy
+# ============================================================================
+
+class ThumbnailError(Exception):
+    """Raised for thumbnail URLs that cannot be proxied"""
+
+def thumb_proxy_url(url):
+    """Local URL serving a cached copy of a remote preview thumbnail"""
+    return f"/admin/api/unsplash/thumb?u={quote(url, safe='')}"
+
+def _is_image_host_url(url):
+    """Whether a URL points at one of the known image CDNs (THUMB_PROXY_HOSTS)"""
+    parsed = urlparse(url)
+    return parsed.scheme in ('http', 'https') and parsed.netloc in Config.THUMB_PROXY_HOSTS
+
+def _is_api_url(url):
+    """Whether a URL is on the configured Unsplash API (same scheme and host)"""
+    parsed, api = urlparse(url), urlparse(UNSPLASH_API_URL)
+    return parsed.scheme == api.scheme and parsed.netloc == api.netloc
+
+def _proxy_allowed(url):
+    """Only known image CDNs (and the configured API host) are proxied"""
+    return _is_image_host_url(url) or _is_api_url(url)
+
+def _sniff_image_type(data):
+    """Mimetype of image bytes from their signature, or None"""
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if data.startswith(b'\x89PNG'):
+        return 'image/png'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    if data.startswith((b'GIF87a', b'GIF89a')):
+        return 'image/gif'
+    head = data[:256].lstrip()
+    if head.startswith((b'<svg', b'<?xml')) and b'<svg' in data[:1024]:
+        return 'image/svg+xml'
+    return None
+
+def get_thumbnail(url):
     """
-    Trigger Unsplash download event and save image locally
+    Open the cached copy of a remote thumbnail, fetching it on first use
+    
+    Returns:
+        tuple: (open file, mimetype, cache key)
+    
+    Raises:
+        ThumbnailError: host not allowed, or the response is not an image
+        requests.RequestException: fetch failed
     """
-    # 0. Check for Mock
-    if str(photo_id).startswith('mock-'):
+    if not _proxy_allowed(url):
+        raise ThumbnailError('Host not allowed')
+    
+    key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    
+    def fetch():
+        with _host_slot(url):
+            resp = http_client.get(url, metric='unsplash.thumb')
+        resp.raise_for_status()
+        if len(resp.content) > Config.THUMB_MAX_BYTES or not _sniff_image_type(resp.content):
+            raise ThumbnailError('Not a thumbnail image')
+        return resp.content
+    
+    f = thumb_cache.open_or_create(key, '', fetch)
+    mimetype = _sniff_image_type(f.read(1024))
+    f.seek(0)
+    return f, mimetype, key
+
+class DownloadTooLarge(Exception):
+    """Raised when a download exceeds UNSPLASH_MAX_DOWNLOAD_BYTES"""
+
+# Content-Type -> file extension for downloaded images
+IMAGE_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/webp': '.webp',
+    'image/gif': '.gif'
+}
+
+def stream_to_uploads(url, name_prefix, params=None):
+    """
+    Stream an image into the uploads folder and run the upload pipeline
+    
+    The body is written to a temp file in chunks (memory stays flat),
+    hashed as it arrives and aborted once it exceeds the size limit.
+    The content hash names the file, so downloading the same image twice
+    reuses the existing upload.
+    
+    Returns:
+        dict from images.process_saved_image, plus 'sha256' and 'reused'
+    """
+    import images as images_module
+    
+    max_bytes = Config.UNSPLASH_MAX_DOWNLOAD_BYTES
+    os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+    
+    with http_client.get(url, metric='unsplash.image', params=params, stream=True) as resp:
+        resp.raise_for_status()
+        
+        if int(resp.headers.get('Content-Length') or 0) > max_bytes:
+            raise DownloadTooLarge(f"Image is larger than {max_bytes} bytes")
+        content_type = resp.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        ext = IMAGE_EXTENSIONS.get(content_type, '.jpg')
+        
+        sha = hashlib.sha256()
+        total = 0
+        fd, temp_path = tempfile.mkstemp(suffix='.part', dir=Config.UPLOAD_FOLDER)
         try:
-            img_url = download_location
-            img_resp = requests.get(img_url)
-            img_resp.raise_for_status()
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in resp.iter_content(chunk_size=Config.DOWNLOAD_CHUNK_SIZE):
+                    total += len(chunk)
+                    if total > max_bytes:
+                        raise DownloadTooLarge(f"Image is larger than {max_bytes} bytes")
+                    sha.update(chunk)
+                    f.write(chunk)
             
-            filename = f"unsplash_mock_{uuid.uuid4().hex[:6]}.jpg"
-            save_path = os.path.join(Config.UPLOAD_FOLDER, filename)
-            os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+            digest = sha.hexdigest()
+            filename = f"{name_prefix}_{digest[:10]}{ext}"
             
-            with open(save_path, 'wb') as f:
-                f.write(img_resp.content)
+            # Same bytes downloaded before (possibly re-encoded since): reuse that upload
+            stem = os.path.splitext(filename)[0]
+            for existing_ext in set(images_module.FORMAT_EXTENSIONS.values()):
+                existing = os.path.join(Config.UPLOAD_FOLDER, stem + existing_ext)
+                if os.path.exists(existing):
+                    os.remove(temp_path)
+                    return {
+                        'success': True,
+                        'filename': os.path.basename(existing),
+                        'path': os.path.relpath(existing, Config.BASE_DIR),
+                        'sha256': digest,
+                        'reused': True
+                    }
             
-            return f"assets/uploads/{filename}"
+            save_path = images_module.unique_path(Config.UPLOAD_FOLDER, filename)
+            os.replace(temp_path, save_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    
+    result = images_module.process_saved_image(save_path)
+    result['sha256'] = digest
+    result['reused'] = False
+    return result
+
+@contextmanager
+def _host_slot(url):
+    """Limit concurrent requests per remote host (UNSPLASH_PER_HOST_LIMIT)"""
+    host = urlparse(url).netloc
+    with _host_slots_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = _host_slots[host] = threading.BoundedSemaphore(Config.UNSPLASH_PER_HOST_LIMIT)
+    with slot:
+        yield
+
+def download_photo(download_location, photo_id, on_progress=None):
+    """
+    Trigger Unsplash download event and save image locally
+    
+    Args:
+        download_location: Unsplash download tracking URL (or image URL for mocks)
+        photo_id: Unsplash photo ID
+        on_progress: Optional callback receiving 'tracking' and 'downloading'
+    
+    Returns:
+        str: path the image is served from (assets/<filename>), or None on error
+    """
+    def progress(phase):
+        if on_progress:
+            on_progress(phase)
+    
+    # 0. Check for Mock
+    if str(photo_id).startswith('mock-'):
+        if not _is_image_host_url(download_location):
+            print(f"Refusing mock download from {urlparse(download_location).netloc!r}")
+            return None
+        try:
+            progress('downloading')
+            with _host_slot(download_location):
+                result = stream_to_uploads(download_location, 'unsplash_mock')
+            return f"assets/{result['filename']}"
         except Exception as e:
             print(f"Mock Download Error: {e}")
             return None
 
+    # The location comes from the client: only the API itself gets the key
+    if not _is_api_url(download_location):
+        print(f"Refusing download location on {urlparse(download_location).netloc!r}")
+        return None
+    
     headers = {
         "Authorization": f"Client-ID {Config.UNSPLASH_ACCESS_KEY}",
         "Accept-Version": "v1"
     }
     
-    try:
-        # 1. Trigger the download endpoint
-        track_resp = requests.get(download_location, headers=headers)
-        track_resp.raise_for_status()
-        download_url = track_resp.json().get('url')
-        
-        # 2. Download the actual image
-        img_resp = requests.get(download_url)
-        img_resp.raise_for_status()
-        
-        # 3. Save locally
-        filename = f"unsplash_{photo_id}_{uuid.uuid4().hex[:6]}.jpg"
-        save_path = os.path.join(Config.UPLOAD_FOLDER, filename)
-        
-        os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
-        
-        with open(save_path, 'wb') as f:
-            f.write(img_resp.content)
-            
-        return f"assets/uploads/{filename}"
-        
-    except requests.RequestException as e:
-        print(f"Download Error: {e}")
-        return None
-    
     try:
         # 1. Trigger the download endpoint (Required by API terms)
         # This returns the actual URL to download from
-        track_resp = requests.get(download_location, headers=headers)
+        progress('tracking')
+        with _host_slot(download_location):
+            track_resp = http_client.get(download_location, metric='unsplash.track', breaker=breaker, headers=headers)
         track_resp.raise_for_status()
         download_url = track_resp.json().get('url')
+        # Image CDNs, or the API host itself (the offline fake server serves images there)
+        if not download_url or not _proxy_allowed(download_url):
+            print(f"Unexpected Unsplash download URL: {download_url!r}")
+            return None
         
-        # 2. Download the actual image
-        img_resp = requests.get(download_url)
-        img_resp.raise_for_status()
-        
-        # 3. Save locally
-        filename = f"unsplash_{photo_id}_{uuid.uuid4().hex[:6]}.jpg"
-        save_path = os.path.join(Config.UPLOAD_FOLDER, filename)
-        
-        # Ensure directory exists
-        os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+        # 2. Stream the image (no larger than we would keep) into uploads
+        progress('downloading')
+        safe_id = re.sub(r'[^\w-]', '', str(photo_id))
+        with _host_slot(download_url):
+            result = stream_to_uploads(download_url, f"unsplash_{safe_id}", params={'w': Config.UNSPLASH_DOWNLOAD_WIDTH})
         
-        with open(save_path, 'wb') as f:
-            f.write(img_resp.content)
-            
-        # Return relative path for frontend
-        return f"assets/uploads/{filename}"
+        # 3. Return path for frontend (uploads are served under /assets/)
+        return f"assets/{result['filename']}"
         
-    except requests.RequestException as e:
+    except (requests.RequestException, DownloadTooLarge, OSError) as e:
         print(f"Download Error: {e}")
         return None
+
+# ============================================================================
+# Batch import
+# ============================================================================
+
+def start_import(photos):
+    """
+    Download several photos concurrently in the background
+    
+    Args:
+        photos: list of dicts with 'id' and 'download_location'
+    
+    Returns:
+        dict: the new job (see get_import_job)
+    """
+    job_id = uuid.uuid4().hex[:12]
+    job = {
+        'id': job_id,
+        'created_at': datetime.now().isoformat(),
+        'items': [
+            {'id': photo.get('id'), 'status': 'queued', 'path': None, 'error': None}
+            for photo in photos
+        ]
+    }
+    
+    with _jobs_lock:
+        _import_jobs[job_id] = job
+        # Keep only the most recent jobs
+        while len(_import_jobs) > Config.UNSPLASH_IMPORT_JOBS_KEPT:
+            _import_jobs.popitem(last=False)
+    
+    for photo, item in zip(photos, job['items']):
+        _import_executor.submit(_import_one, photo, item)
+    
+    return get_import_job(job_id)
+
+def _import_one(photo, item):
+    def set_status(status):
+        with _jobs_lock:
+            item['status'] = status
+    
+    try:
+        if not photo.get('download_location'):
+            raise ValueError('Missing download location')
+        path = download_photo(photo['download_location'], photo.get('id'), on_progress=set_status)
+        with _jobs_lock:
+            item['status'] = 'done' if path else 'error'
+            item['path'] = path
+            item['error'] = None if path else 'Download failed'
+    except Exception as e:
+        with _jobs_lock:
+            item['status'] = 'error'
+            item['error'] = str(e)
+
+def get_import_job(job_id):
+    """Snapshot of an import job with per-item progress, or None"""
+    with _jobs_lock:
+        job = _import_jobs.get(job_id)
+        if job is None:
+            return None
+        items = [dict(item) for item in job['items']]
+    
+    finished = sum(1 for item in items if item['status'] in ('done', 'error'))
+    return {
+        'id': job['id'],
+        'created_at': job['created_at'],
+        'total': len(items),
+        'completed': finished,
+        'done': finished == len(items),
+        'items': items
+    }
@@ -0,0 +1,247 @@
+"""
+Watcher Module
+Notices files changed under the content and upload folders (by the admin or
+by external scripts such as run_import.py) and tells subscribed caches,
+using inotify when available and batched scandir polling otherwise
+"""
+import os
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from config import Config
+
+# inotify event flags (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, name length
+
+_subscribers = []
+_lock = threading.Condition()
+_pending = set()
+_rescan = False  # events were lost; subscribers must assume anything changed
+_first_event = None
+_last_event = None
+_started = None
+
+
+def subscribe(callback):
+    """
+    Register a cache invalidation callback
+
+    callback(paths) receives a set of absolute paths that were created,
+    modified or deleted, or None when changes were lost (inotify queue
+    overflow) and everything should be treated as changed.
+    """
+    _subscribers.append(callback)
+
+
+def _ignored(path):
+    """Temporary files written by atomic saves"""
+    name = os.path.basename(path)
+    return name.startswith('.') or '.tmp' in name
+
+
+def publish(paths):
+    """
+    Queue changed paths for the subscribers (None means rescan everything)
+
+    Without a running watcher the subscribers are called right away, so
+    writers such as restores can rely on caches being invalidated.
+    """
+    global _rescan, _first_event, _last_event
+    if not _started:
+        if paths is not None:
+            paths = {os.path.abspath(p) for p in paths if not _ignored(p)}
+            if not paths:
+                return
+        _deliver(paths)
+        return
+    with _lock:
+        if paths is None:
+            _rescan = True
+        else:
+            _pending.update(os.path.abspath(p) for p in paths if not _ignored(p))
+            if not _pending and not _rescan:
+                return
+        now = time.monotonic()
+        _first_event = _first_event or now
+        _last_event = now
+        _lock.notify()
+
+
+def _dispatch_loop():
+    """Deliver batches once changes have been quiet for WATCH_DEBOUNCE seconds"""
+    global _rescan, _first_event, _last_event
+    while True:
+        with _lock:
+            while True:
+                if _first_event is None:
+                    _lock.wait()
+                    continue
+                now = time.monotonic()
+                due = min(_last_event + Config.WATCH_DEBOUNCE, _first_event + Config.WATCH_MAX_DELAY)
+                if now >= due:
+                    break
+                _lock.wait(due - now)
+            paths = None if _rescan else set(_pending)
+            _pending.clear()
+            _rescan = False
+            _first_event = _last_event = None
+
+        _deliver(paths)
+
+
+def _deliver(paths):
+    for callback in list(_subscribers):
+        try:
+            callback(paths)
+        except Exception as e:
+            print(f"Watcher subscriber {getattr(callback, '__qualname__', callback)} failed: {e}")
+
+
+def _load_libc():
+    """libc with inotify support, or None"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    except OSError:
+        return None
+    return libc if hasattr(libc, 'inotify_init1') else None
+
+
+class InotifyBackend:
+    """Recursive watches on each root through the inotify syscalls"""
+
+    def __init__(self, libc, roots):
+        self.libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.watches = {}  # wd -> directory
+        for root in roots:
+            self._add_tree(root)
+
+    def _add_watch(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd >= 0:
+            self.watches[wd] = directory
+
+    def _add_tree(self, root):
+        """Watch a directory and everything below it; returns the files found"""
+        files = []
+        for current, dirs, names in os.walk(root):
+            self._add_watch(current)
+            files.extend(os.path.join(current, name) for name in names)
+        return files
+
+    def run(self):
+        while True:
+            select.select([self.fd], [], [])
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+
+            changed, offset = [], 0
+            while offset < len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    publish(None)
+                    continue
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    continue
+                directory = self.watches.get(wd)
+                if directory is None or not name:
+                    continue
+
+                path = os.path.join(directory, name)
+                if mask & IN_ISDIR:
+                    # Files may land in a new directory before it is watched
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        changed.extend(self._add_tree(path))
+                else:
+                    changed.append(path)
+            if changed:
+                publish(changed)
+
+
+class PollingBackend:
+    """Compares scandir snapshots of each root every WATCH_POLL_INTERVAL seconds"""
+
+    def __init__(self, roots):
+        self.roots = roots
+        self.snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        pending = list(self.roots)
+        while pending:
+            try:
+                with os.scandir(pending.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.is_file():
+                            stat = entry.stat()
+                            snapshot[entry.path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                pass
+        return snapshot
+
+    def run(self):
+        while True:
+            time.sleep(Config.WATCH_POLL_INTERVAL)
+            current = self._scan()
+            changed = {path for path, sig in current.items() if self.snapshot.get(path) != sig}
+            changed.update(path for path in self.snapshot if path not in current)
+            self.snapshot = current
+            if changed:
+                publish(changed)
+
+
+def start(roots=None):
+    """
+    Start watching (once per process)
+
+    Args:
+        roots: Directories to watch (defaults to Config.WATCH_PATHS)
+
+    Returns:
+        str: backend in use, 'inotify' or 'polling'
+    """
+    global _started
+    with _lock:
+        if _started:
+            return _started
+
+        roots = [os.path.abspath(r) for r in (roots or Config.WATCH_PATHS) if os.path.isdir(r)]
+        libc = _load_libc() if Config.WATCH_BACKEND in ('auto', 'inotify') else None
+        backend = None
+        if libc is not None:
+            try:
+                backend = InotifyBackend(libc, roots)
+                _started = 'inotify'
+            except OSError as e:
+                print(f"inotify unavailable ({e}); polling for changes instead")
+        if backend is None:
+            backend = PollingBackend(roots)
+            _started = 'polling'
+
+        threading.Thread(target=backend.run, daemon=True, name='watcher').start()
+        threading.Thread(target=_dispatch_loop, daemon=True, name='watcher-dispatch').start()
+        return _started